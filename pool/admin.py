@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Season, Week, Team, Game, ConfidencePick, SurvivorPick, UserSeasonStats, WeeklyResult
+from .survivor import refresh_survivor_teams
 
 
 @admin.register(Season)
@@ -25,7 +26,8 @@ class TeamAdmin(admin.ModelAdmin):
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
-    list_display = ['week', 'away_team', 'home_team', 'game_day', 'game_time', 'is_final', 'score_display']
+    list_display = ['week', 'away_team', 'home_team', 'game_day', 'game_time', 'is_final', 'score_display', 'winning_team']
+    list_select_related = ['week__season', 'away_team', 'home_team', 'winning_team']
     list_filter = ['week__season', 'week__week_number', 'game_day', 'is_final']
     search_fields = ['home_team__name', 'away_team__name']
     ordering = ['-week__season__year', 'week__week_number', 'game_time']
@@ -39,8 +41,9 @@ class GameAdmin(admin.ModelAdmin):
 
 @admin.register(ConfidencePick)
 class ConfidencePickAdmin(admin.ModelAdmin):
-    list_display = ['user', 'game', 'picked_team', 'confidence_points', 'is_correct', 'created_at']
-    list_filter = ['game__week__season', 'game__week__week_number', 'picked_team']
+    list_display = ['user', 'game', 'picked_team', 'confidence_points', 'is_correct', 'points_awarded', 'created_at']
+    list_select_related = ['user', 'game__week__season', 'game__home_team', 'game__away_team', 'picked_team']
+    list_filter = ['game__week__season', 'game__week__week_number', 'picked_team', 'is_correct']
     search_fields = ['user__email', 'user__username']
     ordering = ['-created_at']
 
@@ -52,6 +55,24 @@ class SurvivorPickAdmin(admin.ModelAdmin):
     search_fields = ['user__email', 'user__username', 'picked_team__name']
     ordering = ['-week__season__year', 'week__week_number']
 
+    # Picks edited here bypass WeekContext.save_picks, so rebuild the used-teams masks they touch
+    def save_model(self, request, obj, form, change):
+        before = []
+        if change:
+            before = list(SurvivorPick.objects.filter(pk=obj.pk).values_list('user_id', 'week__season_id'))
+        super().save_model(request, obj, form, change)
+        refresh_survivor_teams(before + [(obj.user_id, obj.week.season_id)])
+
+    def delete_model(self, request, obj):
+        season_id = obj.week.season_id
+        super().delete_model(request, obj)
+        refresh_survivor_teams([(obj.user_id, season_id)])
+
+    def delete_queryset(self, request, queryset):
+        affected = list(queryset.values_list('user_id', 'week__season_id'))
+        super().delete_queryset(request, queryset)
+        refresh_survivor_teams(affected)
+
 
 @admin.register(UserSeasonStats)
 class UserSeasonStatsAdmin(admin.ModelAdmin):
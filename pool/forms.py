@@ -1,12 +1,49 @@
+import copy
+from functools import lru_cache
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import ConfidencePick, SurvivorPick, Game, Team, Week
+from .models import UserSeasonStats, survivor_mask
+from .picks import WeekContext
+
+
+def games_fingerprint(games):
+    """Everything a week's pick fields depend on: game order, ids and teams"""
+    return tuple(
+        (game.id, game.home_team.id, game.home_team.abbreviation, game.away_team.id, game.away_team.abbreviation)
+        for game in games
+    )
+
+
+@lru_cache(maxsize=64)
+def pick_field_prototypes(week_id, fingerprint):
+    """The team and confidence fields for a week, built once per process
+
+    Keyed by week and games fingerprint, so rescheduling a game or changing its teams builds
+    new fields on the next request. Callers must copy the fields rather than modify them.
+    """
+    fields = {}
+    for game_id, home_id, home_abbreviation, away_id, away_abbreviation in fingerprint:
+        # Team selection field
+        fields[f'game_{game_id}_team'] = forms.ChoiceField(
+            choices=[(home_id, f"{home_abbreviation} (Home)"), (away_id, f"{away_abbreviation} (Away)")],
+            widget=forms.RadioSelect,
+            label=f"{away_abbreviation} @ {home_abbreviation}"
+        )
+
+        # Confidence points field
+        fields[f'game_{game_id}_confidence'] = forms.IntegerField(
+            min_value=1,
+            max_value=len(fingerprint),
+            widget=forms.NumberInput(attrs={'class': 'confidence-input'}),
+            label='Confidence'
+        )
+    return fields
 
 
 class WeekPicksForm(forms.Form):
     """Form for making confidence picks for a week"""
 
-    def __init__(self, *args, week=None, user=None, **kwargs):
+    def __init__(self, *args, week=None, user=None, week_context=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.week = week
         self.user = user
@@ -14,48 +51,32 @@ class WeekPicksForm(forms.Form):
         if not week:
             return
 
-        # Get all Saturday/Sunday games for this week
-        games = Game.objects.filter(week=week).order_by('game_time')
+        # Games, the Bears and existing picks are shared with the view through its WeekContext
+        self.week_context = week_context or WeekContext(week, user)
+        games = self.week_context.games
         self.games = games
-        self.num_games = games.count()
-
-        # Get the Chicago Bears team
-        try:
-            self.bears = Team.objects.get(abbreviation='CHI')
-        except Team.DoesNotExist:
-            self.bears = None
-
-        # Create fields for each game
-        for game in games:
-            # Team selection field
-            choices = [
-                (game.home_team.id, f"{game.home_team.abbreviation} (Home)"),
-                (game.away_team.id, f"{game.away_team.abbreviation} (Away)")
-            ]
-            self.fields[f'game_{game.id}_team'] = forms.ChoiceField(
-                choices=choices,
-                widget=forms.RadioSelect,
-                label=f"{game.away_team.abbreviation} @ {game.home_team.abbreviation}"
-            )
+        self.num_games = len(games)
+        self.bears = self.week_context.bears
 
-            # Confidence points field
-            self.fields[f'game_{game.id}_confidence'] = forms.IntegerField(
-                min_value=1,
-                max_value=self.num_games,
-                widget=forms.NumberInput(attrs={'class': 'confidence-input'}),
-                label='Confidence'
-            )
+        # Every entrant gets the same fields for a week: copy the prebuilt ones. Shallow copies are
+        # enough, as the only per-form change is `initial`
+        for name, field in pick_field_prototypes(week.id, games_fingerprint(games)).items():
+            self.fields[name] = copy.copy(field)
 
         # Load existing picks if any
-        if user:
-            existing_picks = ConfidencePick.objects.filter(
-                user=user,
-                game__week=week
-            ).select_related('game', 'picked_team')
-
-            for pick in existing_picks:
-                self.fields[f'game_{pick.game.id}_team'].initial = pick.picked_team.id
-                self.fields[f'game_{pick.game.id}_confidence'].initial = pick.confidence_points
+        for game_id, pick in self.week_context.confidence_picks.items():
+            self.fields[f'game_{game_id}_team'].initial = pick.picked_team_id
+            self.fields[f'game_{game_id}_confidence'].initial = pick.confidence_points
+
+    def picks(self):
+        """Game id to (picked team id, confidence points) from the cleaned form"""
+        return {
+            game.id: (
+                int(self.cleaned_data[f'game_{game.id}_team']),
+                self.cleaned_data[f'game_{game.id}_confidence'],
+            )
+            for game in self.games
+        }
 
     def clean(self):
         cleaned_data = super().clean()
@@ -101,25 +122,33 @@ class WeekPicksForm(forms.Form):
 class SurvivorPickForm(forms.Form):
     """Form for making survivor picks"""
 
-    def __init__(self, *args, week=None, user=None, **kwargs):
+    def __init__(self, *args, week=None, user=None, stats=None, week_context=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.week = week
         self.user = user
+        self.teams = {}
+        self.existing_picks = []
 
         if not week or not user:
             return
 
-        # Get teams that user has already used for survivor this season
-        season = week.season
-        used_teams = SurvivorPick.objects.filter(
-            user=user,
-            week__season=season
-        ).values_list('picked_team_id', flat=True)
+        # Teams used this season come from the stats mask, not a scan of past picks
+        if stats is None:
+            stats = UserSeasonStats.objects.filter(user=user, season=week.season).first()
+        self.stats = stats
 
-        # Get all teams except those already used
-        available_teams = Team.objects.exclude(id__in=used_teams).order_by('city', 'name')
+        self.week_context = week_context or WeekContext(week, user)
+        self.teams = self.week_context.teams
+        self.existing_picks = self.week_context.survivor_picks
 
-        team_choices = [(team.id, str(team)) for team in available_teams]
+        # This week's own picks stay available so they can be kept or swapped
+        self.used_mask = stats.survivor_teams_used if stats else 0
+        self.used_mask &= ~survivor_mask(self.teams[pick.picked_team_id] for pick in self.existing_picks)
+
+        team_choices = [
+            (team.id, str(team)) for team in self.teams.values()
+            if not self.used_mask & team.survivor_mask
+        ]
 
         # Determine number of picks required
         num_picks = week.survivor_picks_required()
@@ -133,14 +162,16 @@ class SurvivorPickForm(forms.Form):
             )
 
         # Load existing picks
-        existing_picks = SurvivorPick.objects.filter(
-            user=user,
-            week=week
-        ).order_by('id')
-
-        for i, pick in enumerate(existing_picks):
+        for i, pick in enumerate(self.existing_picks):
             if i < num_picks:
-                self.fields[f'survivor_pick_{i+1}'].initial = pick.picked_team.id
+                self.fields[f'survivor_pick_{i+1}'].initial = pick.picked_team_id
+
+    def picked_teams(self):
+        """Teams chosen in the cleaned form"""
+        return [
+            self.teams[int(self.cleaned_data[f'survivor_pick_{i+1}'])]
+            for i in range(self.week.survivor_picks_required())
+        ]
 
     def clean(self):
         cleaned_data = super().clean()
@@ -161,4 +192,10 @@ class SurvivorPickForm(forms.Form):
         if len(picked_teams) != len(set(picked_teams)):
             raise ValidationError("You cannot pick the same team multiple times in one week!")
 
+        # Ensure no team used in an earlier week is picked again
+        for team_id in picked_teams:
+            team = self.teams.get(team_id)
+            if team and self.used_mask & team.survivor_mask:
+                raise ValidationError(f"You have already used the {team} this season!")
+
         return cleaned_data
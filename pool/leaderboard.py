@@ -0,0 +1,172 @@
+from decimal import Decimal, InvalidOperation
+from django.db.models import Count, Q
+
+PAGE_SIZE = 50
+# Rows shown on each side of the current user in "around me" mode
+AROUND_ME_NEIGHBORS = 10
+# Matches the UserSeasonStats leaderboard index; id breaks ties so every row has a unique position
+LEADERBOARD_ORDER = ['-playoff_points', '-total_confidence_points', '-id']
+REVERSE_ORDER = ['playoff_points', 'total_confidence_points', 'id']
+# Live standings are ranked when they are written, so the stored rank orders them
+LIVE_ORDER = ['projected_rank', 'id']
+LIVE_REVERSE_ORDER = ['-projected_rank', '-id']
+
+
+def sort_key(stats):
+    return (stats.playoff_points, stats.total_confidence_points, stats.id)
+
+
+def encode_cursor(stats):
+    return '{}_{}_{}'.format(*sort_key(stats))
+
+
+def decode_cursor(value):
+    """(playoff_points, total_confidence_points, id) from a cursor, or None if it is missing or malformed"""
+    try:
+        playoff_points, confidence_points, stats_id = value.split('_')
+        return Decimal(playoff_points), int(confidence_points), int(stats_id)
+    except (AttributeError, ValueError, InvalidOperation):
+        return None
+
+
+def after_q(key):
+    """Rows that come after `key` in leaderboard order"""
+    playoff_points, confidence_points, stats_id = key
+    return (
+        Q(playoff_points__lt=playoff_points)
+        | Q(playoff_points=playoff_points, total_confidence_points__lt=confidence_points)
+        | Q(playoff_points=playoff_points, total_confidence_points=confidence_points, id__lt=stats_id)
+    )
+
+
+def before_q(key):
+    """Rows that come before `key` in leaderboard order"""
+    playoff_points, confidence_points, stats_id = key
+    return (
+        Q(playoff_points__gt=playoff_points)
+        | Q(playoff_points=playoff_points, total_confidence_points__gt=confidence_points)
+        | Q(playoff_points=playoff_points, total_confidence_points=confidence_points, id__gt=stats_id)
+    )
+
+
+def ahead_q(key):
+    """Rows with strictly better totals than `key`; these alone decide its rank"""
+    playoff_points, confidence_points, _ = key
+    return Q(playoff_points__gt=playoff_points) | Q(
+        playoff_points=playoff_points, total_confidence_points__gt=confidence_points
+    )
+
+
+def leaderboard_page(standings, after=None, before=None, size=PAGE_SIZE):
+    """One page of `standings` following the `after` cursor, or preceding the `before` cursor"""
+    if before:
+        rows = list(standings.filter(before_q(before)).order_by(*REVERSE_ORDER)[:size])[::-1]
+    elif after:
+        rows = list(standings.filter(after_q(after)).order_by(*LEADERBOARD_ORDER)[:size])
+    else:
+        rows = list(standings.order_by(*LEADERBOARD_ORDER)[:size])
+    return ranked_page(standings, rows)
+
+
+def around_me(standings, stats, neighbors=AROUND_ME_NEIGHBORS):
+    """The user's row with up to `neighbors` rows on either side"""
+    key = sort_key(stats)
+    above = list(standings.filter(before_q(key)).order_by(*REVERSE_ORDER)[:neighbors])[::-1]
+    below = list(standings.filter(after_q(key)).order_by(*LEADERBOARD_ORDER)[:neighbors])
+    me = standings.get(id=stats.id)
+    return ranked_page(standings, above + [me] + below)
+
+
+def ranked_page(standings, rows):
+    """Set `rank` on each row (tied totals share a rank) and work out the neighbouring page cursors
+
+    A single aggregate counts the rows ahead of the page, so cost does not depend on how deep the page is.
+    """
+    page = {'rows': rows, 'previous_cursor': None, 'next_cursor': None}
+    if not rows:
+        return page
+
+    first, last = sort_key(rows[0]), sort_key(rows[-1])
+    counts = standings.order_by().aggregate(
+        position=Count('id', filter=before_q(first)),
+        ahead=Count('id', filter=ahead_q(first)),
+        remaining=Count('id', filter=after_q(last)),
+    )
+
+    rows[0].rank = counts['ahead'] + 1
+    for index in range(1, len(rows)):
+        previous, row = rows[index - 1], rows[index]
+        if sort_key(row)[:2] == sort_key(previous)[:2]:
+            row.rank = previous.rank
+        else:
+            row.rank = counts['position'] + index + 1
+
+    if counts['position']:
+        page['previous_cursor'] = encode_cursor(rows[0])
+    if counts['remaining']:
+        page['next_cursor'] = encode_cursor(rows[-1])
+    return page
+
+
+def encode_live_cursor(standing):
+    return f'{standing.projected_rank}_{standing.id}'
+
+
+def decode_live_cursor(value):
+    """(projected_rank, id) from a live standings cursor, or None if it is missing or malformed"""
+    try:
+        projected_rank, standing_id = value.split('_')
+        return int(projected_rank), int(standing_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def live_after_q(key):
+    """Live standings that come after `key` in rank order"""
+    projected_rank, standing_id = key
+    return Q(projected_rank__gt=projected_rank) | Q(projected_rank=projected_rank, id__gt=standing_id)
+
+
+def live_before_q(key):
+    """Live standings that come before `key` in rank order"""
+    projected_rank, standing_id = key
+    return Q(projected_rank__lt=projected_rank) | Q(projected_rank=projected_rank, id__lt=standing_id)
+
+
+def live_standings_page(standings, after=None, before=None, size=PAGE_SIZE):
+    """One page of ranked live `standings` following the `after` cursor, or preceding the `before` cursor"""
+    standings = standings.filter(projected_rank__isnull=False)
+    if before:
+        rows = list(standings.filter(live_before_q(before)).order_by(*LIVE_REVERSE_ORDER)[:size])[::-1]
+    elif after:
+        rows = list(standings.filter(live_after_q(after)).order_by(*LIVE_ORDER)[:size])
+    else:
+        rows = list(standings.order_by(*LIVE_ORDER)[:size])
+    return live_page(standings, rows)
+
+
+def live_around_me(standings, standing, neighbors=AROUND_ME_NEIGHBORS):
+    """The user's live standing with up to `neighbors` rows on either side"""
+    standings = standings.filter(projected_rank__isnull=False)
+    key = (standing.projected_rank, standing.id)
+    above = list(standings.filter(live_before_q(key)).order_by(*LIVE_REVERSE_ORDER)[:neighbors])[::-1]
+    below = list(standings.filter(live_after_q(key)).order_by(*LIVE_ORDER)[:neighbors])
+    return live_page(standings, above + [standing] + below)
+
+
+def live_page(standings, rows):
+    """Work out the neighbouring page cursors for `rows` with one aggregate"""
+    page = {'rows': rows, 'previous_cursor': None, 'next_cursor': None}
+    if not rows:
+        return page
+
+    first, last = rows[0], rows[-1]
+    counts = standings.order_by().aggregate(
+        position=Count('id', filter=live_before_q((first.projected_rank, first.id))),
+        remaining=Count('id', filter=live_after_q((last.projected_rank, last.id))),
+    )
+    if counts['position']:
+        page['previous_cursor'] = encode_live_cursor(first)
+    if counts['remaining']:
+        page['next_cursor'] = encode_live_cursor(last)
+    return page
@@ -0,0 +1,255 @@
+import json
+import platform
+import statistics
+import tracemalloc
+from io import StringIO
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from pool.models import Season, ConfidencePick, SurvivorPick
+from pool.profiling import PhaseProfiler
+
+BENCHMARKS = ['score_games', 'rescore_week', 'make_picks_get', 'make_picks_post', 'leaderboard', 'home']
+BENCH_SEASON = 2099
+# Changes smaller than these are noise, whatever the relative change
+MIN_WALL_DELTA = 0.005
+MIN_MEMORY_DELTA_KB = 1024
+
+
+class Command(BaseCommand):
+    help = 'Time scoring, pick submission and page rendering against synthetic pools and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help='Pool sizes (number of users) to benchmark',
+        )
+        parser.add_argument(
+            '--benchmarks',
+            nargs='+',
+            choices=BENCHMARKS,
+            default=BENCHMARKS,
+            help='Benchmarks to run (default: all)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timed runs per benchmark; the median is reported',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for the synthetic pools',
+        )
+        parser.add_argument(
+            '--output',
+            default='bench-results.json',
+            help='Write results to this JSON file',
+        )
+        parser.add_argument(
+            '--baseline',
+            default='bench-baseline.json',
+            help='Compare against this JSON file, if it exists',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Also write the results to the baseline file',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed relative increase in wall time and peak memory before a benchmark counts as a regression',
+        )
+
+    def handle(self, *args, **options):
+        baseline = self.load_baseline(options['baseline'])
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'pools': {},
+        }
+
+        # Benchmarks run against a throwaway test database, never the real one
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            }):
+                for users in options['sizes']:
+                    pool = self.bench_pool(users, options)
+                    results['pools'][str(users)] = pool
+                    self.report(users, pool, baseline.get('pools', {}).get(str(users), {}))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.write_json(options['output'], results)
+        self.stdout.write(f'Results written to {options["output"]}')
+        if options['save_baseline']:
+            self.write_json(options['baseline'], results)
+            self.stdout.write(f'Baseline saved to {options["baseline"]}')
+
+        regressions = self.regressions(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        if baseline:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def bench_pool(self, users, options):
+        """Build a fresh pool of `users` users and run each benchmark against it"""
+        self.stdout.write(f'Building a pool of {users} users...')
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('populate_teams', stdout=StringIO())
+
+        # Every week but the last is final, so there is history to score and an open week to pick
+        call_command(
+            'generate_synthetic_pool',
+            '--users', users,
+            '--season', BENCH_SEASON,
+            '--final-weeks', 17,
+            '--seed', options['seed'],
+            stdout=StringIO(),
+        )
+        season = Season.objects.get(year=BENCH_SEASON)
+        weeks = list(season.weeks.order_by('week_number'))
+        open_week, scored_week = weeks[-1], weeks[-2]
+        Season.objects.filter(id=season.id).update(is_active=True)
+        season.weeks.filter(id=open_week.id).update(is_active=True)
+        call_command('score_games', stdout=StringIO())
+
+        user = User.objects.filter(username__startswith=f'synthetic-{BENCH_SEASON}-').order_by('id').first()
+        client = Client()
+        client.force_login(user)
+        picks_url = reverse('pool:make_picks', args=[open_week.id])
+        post_data = self.picks_post_data(user, open_week)
+
+        def get(url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'GET {url} returned {response.status_code}')
+
+        def post_picks():
+            response = client.post(picks_url, post_data)
+            if response.status_code != 302:
+                raise CommandError(f'POST {picks_url} was rejected: {response.status_code}')
+
+        runs = {
+            'score_games': lambda: call_command('score_games', '--all', stdout=StringIO()),
+            'rescore_week': lambda: call_command('score_games', '--week-id', scored_week.id, stdout=StringIO()),
+            'make_picks_get': lambda: get(picks_url),
+            'make_picks_post': post_picks,
+            'leaderboard': lambda: get(reverse('pool:leaderboard')),
+            'home': lambda: get(reverse('pool:home')),
+        }
+        return {name: self.measure(runs[name], options['repeat']) for name in options['benchmarks']}
+
+    def picks_post_data(self, user, week):
+        """Resubmit the user's own picks for `week`, which the forms accept every time"""
+        data = {}
+        for game_id, team_id, points in ConfidencePick.objects.filter(user=user, game__week=week).values_list(
+            'game_id', 'picked_team_id', 'confidence_points'
+        ):
+            data[f'game_{game_id}_team'] = team_id
+            data[f'game_{game_id}_confidence'] = points
+        survivor_teams = SurvivorPick.objects.filter(user=user, week=week).order_by('id').values_list(
+            'picked_team_id', flat=True
+        )
+        for i, team_id in enumerate(survivor_teams, 1):
+            data[f'survivor_pick_{i}'] = team_id
+        return data
+
+    def measure(self, run, repeat):
+        """Peak memory from one traced run (which also warms up), then wall time and queries from `repeat` runs
+
+        tracemalloc slows allocation-heavy code down, so it is kept out of the timed runs.
+        Each run starts with an empty cache.
+        """
+        cache.clear()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        walls = []
+        for _ in range(max(repeat, 1)):
+            cache.clear()
+            profiler = PhaseProfiler()
+            with profiler.capture_queries(), profiler.phase('run'):
+                run()
+            walls.append(profiler.phases['run']['wall'])
+        stats = profiler.phases['run']
+
+        return {
+            'wall': round(statistics.median(walls), 6),
+            'wall_min': round(min(walls), 6),
+            'queries': stats['queries'],
+            'query_time': round(stats['query_time'], 6),
+            'peak_memory_kb': peak // 1024,
+        }
+
+    def report(self, users, pool, baseline):
+        self.stdout.write(f'\n{users} users')
+        self.stdout.write(f'{"Benchmark":<18}{"Wall (s)":>10}{"Queries":>9}{"Peak (MB)":>11}{"vs baseline":>14}')
+        for name, stats in pool.items():
+            previous = baseline.get(name)
+            change = f'{(stats["wall"] / previous["wall"] - 1) * 100:+.0f}%' if previous and previous['wall'] else ''
+            self.stdout.write(
+                f'{name:<18}{stats["wall"]:>10.3f}{stats["queries"]:>9}'
+                f'{stats["peak_memory_kb"] / 1024:>11.1f}{change:>14}'
+            )
+        self.stdout.write('')
+
+    def regressions(self, results, baseline, tolerance):
+        """Benchmarks that got slower, hungrier or chattier than the baseline at the same pool size"""
+        found = []
+        for users, pool in results['pools'].items():
+            for name, stats in pool.items():
+                previous = baseline.get('pools', {}).get(users, {}).get(name)
+                if not previous:
+                    continue
+                label = f'{name} ({users} users)'
+                if stats['queries'] > previous['queries']:
+                    found.append(f'{label}: {previous["queries"]} -> {stats["queries"]} queries')
+                if (stats['wall'] > previous['wall'] * (1 + tolerance)
+                        and stats['wall'] - previous['wall'] > MIN_WALL_DELTA):
+                    found.append(f'{label}: {previous["wall"]:.3f}s -> {stats["wall"]:.3f}s')
+                if (stats['peak_memory_kb'] > previous['peak_memory_kb'] * (1 + tolerance)
+                        and stats['peak_memory_kb'] - previous['peak_memory_kb'] > MIN_MEMORY_DELTA_KB):
+                    found.append(
+                        f'{label}: {previous["peak_memory_kb"]} KB -> {stats["peak_memory_kb"]} KB peak memory'
+                    )
+        return found
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            raise CommandError(f'Could not read baseline {path}: {e}')
+
+    def write_json(self, path, data):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.write('\n')
@@ -0,0 +1,196 @@
+import random
+from datetime import datetime, timedelta, UTC
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from pool.models import Season, Week, Game, Team, ConfidencePick, SurvivorPick, UserSeasonStats
+
+
+class Command(BaseCommand):
+    help = 'Create a season of synthetic users, picks and final scores for load and scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Number of synthetic users to create',
+        )
+        parser.add_argument(
+            '--season',
+            type=int,
+            default=2099,
+            help="Season year; an existing season's schedule is reused, otherwise one is generated",
+        )
+        parser.add_argument(
+            '--weeks',
+            type=int,
+            default=18,
+            help='Weeks to generate when the season has no schedule yet',
+        )
+        parser.add_argument(
+            '--final-weeks',
+            type=int,
+            help='Give random final scores to this many weeks (defaults to all of them)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed, so the same arguments build the same pool',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Users whose picks are built and inserted per batch',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        teams = list(Team.objects.order_by('id'))
+        if len(teams) < 32:
+            raise CommandError('Run populate_teams first.')
+
+        self.bears_id = next((team.id for team in teams if team.abbreviation == 'CHI'), None)
+        self.bits = {team.id: team.survivor_bit for team in teams}
+        started = timezone.now()
+
+        if connection.vendor == 'sqlite':
+            # The default 2MB page cache thrashes while maintaining the pick indexes
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        with transaction.atomic():
+            season, _ = Season.objects.get_or_create(year=options['season'], defaults={'is_active': False})
+            weeks = list(season.weeks.filter(games__isnull=False).distinct().order_by('week_number'))
+            if not weeks:
+                weeks = self.create_schedule(season, teams, options['weeks'])
+                self.stdout.write(f'Generated {len(weeks)} weeks of games for {season}')
+
+            final_weeks = weeks[:options['final_weeks']] if options['final_weeks'] is not None else weeks
+            self.finalize_games(final_weeks)
+
+            # Everything a pick needs, as plain tuples, so building millions of picks stays cheap
+            self.schedule = [
+                (week, list(week.games.values_list('id', 'home_team_id', 'away_team_id')))
+                for week in weeks
+            ]
+
+            created = 0
+            for start in range(0, options['users'], options['chunk_size']):
+                count = min(options['chunk_size'], options['users'] - start)
+                created += self.create_users(season, count)
+                self.stdout.write(f'  {created}/{options["users"]} users')
+
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} users with picks for {len(weeks)} weeks of {season} in {elapsed:.1f}s. '
+            f'Run score_games --all to score them.'
+        ))
+
+    def create_schedule(self, season, teams, num_weeks):
+        """Weeks of 16 games each, every team playing once per week"""
+        kickoff = datetime(season.year, 9, 7, 17, 0, tzinfo=UTC)
+        Week.objects.bulk_create([
+            Week(
+                season=season,
+                week_number=number,
+                picks_deadline=kickoff + timedelta(weeks=number - 1),
+            )
+            for number in range(1, num_weeks + 1)
+        ])
+        weeks = list(season.weeks.order_by('week_number'))
+
+        games = []
+        for week in weeks:
+            shuffled = teams[:]
+            self.rng.shuffle(shuffled)
+            game_time = kickoff + timedelta(weeks=week.week_number - 1)
+            for i in range(0, len(shuffled) - 1, 2):
+                games.append(Game(
+                    week=week,
+                    home_team=shuffled[i],
+                    away_team=shuffled[i + 1],
+                    game_time=game_time + timedelta(hours=3 * (i // 12)),
+                    game_day=Game.SUNDAY,
+                ))
+        Game.objects.bulk_create(games)
+        return weeks
+
+    def finalize_games(self, weeks):
+        """Random final scores for the weeks' games; bulk_update skips save(), so set the winner here"""
+        games = list(Game.objects.filter(week__in=weeks))
+        now = timezone.now()
+        for game in games:
+            game.home_score = self.rng.randint(0, 45)
+            game.away_score = self.rng.randint(0, 45)
+            game.is_final = True
+            game.winning_team_id = game.compute_winning_team_id()
+            game.updated_at = now
+        Game.objects.bulk_update(
+            games, ['home_score', 'away_score', 'is_final', 'winning_team', 'updated_at'], batch_size=1000
+        )
+
+    def create_users(self, season, count):
+        """Create `count` users with a full confidence sheet and survivor picks for every week"""
+        first = User.objects.filter(username__startswith=f'synthetic-{season.year}-').count()
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(
+                username=f'synthetic-{season.year}-{n}',
+                email=f'synthetic-{season.year}-{n}@example.com',
+                password=password,
+            )
+            for n in range(first, first + count)
+        ])
+        user_ids = list(User.objects.filter(
+            username__startswith=f'synthetic-{season.year}-',
+        ).order_by('-id').values_list('id', flat=True)[:count])
+
+        # Picks are inserted as pre-adapted tuples: bulk_create spends ~100us preparing each row,
+        # which dominates at millions of picks
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        confidence_picks = []
+        survivor_picks = []
+        stats = []
+        for user_id in user_ids:
+            used = set()
+            mask = 0
+            for week, games in self.schedule:
+                confidence = list(range(1, len(games) + 1))
+                self.rng.shuffle(confidence)
+                for (game_id, home_team_id, away_team_id), points in zip(games, confidence):
+                    if self.bears_id in (home_team_id, away_team_id):
+                        picked_team_id = self.bears_id
+                    else:
+                        picked_team_id = home_team_id if self.rng.random() < 0.5 else away_team_id
+                    confidence_picks.append((user_id, game_id, picked_team_id, points, 0, now, now))
+
+                # Survivor picks come from teams playing this week that the user hasn't used yet
+                available = [team_id for game in games for team_id in game[1:] if team_id not in used]
+                for team_id in self.rng.sample(available, min(week.survivor_picks_required(), len(available))):
+                    used.add(team_id)
+                    mask |= 1 << self.bits[team_id]
+                    survivor_picks.append((user_id, week.id, team_id, now))
+
+            stats.append(UserSeasonStats(user_id=user_id, season=season, survivor_teams_used=mask))
+
+        self.insert_rows(
+            ConfidencePick,
+            ['user', 'game', 'picked_team', 'confidence_points', 'points_awarded', 'created_at', 'updated_at'],
+            confidence_picks,
+        )
+        self.insert_rows(SurvivorPick, ['user', 'week', 'picked_team', 'created_at'], survivor_picks)
+        UserSeasonStats.objects.bulk_create(stats)
+        return len(user_ids)
+
+    def insert_rows(self, model, fields, rows):
+        """INSERT already-adapted rows with executemany"""
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
@@ -0,0 +1,146 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from pool.models import (
+    Season, Week, Game, ConfidencePick, SurvivorPick, UserSeasonStats, WeeklyResult, ScoringLedger, LeaderboardSnapshot,
+)
+from pool.scoring import (
+    assign_ranks, ensure_season_stats, mark_games_scored, save_pick_outcomes, save_survivor_outcomes,
+    write_leaderboard_snapshots,
+)
+from pool.survivor import invalidate_survivor_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute every weekly result and season stat for a season from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--season',
+            type=int,
+            help='Season year to rebuild (defaults to the active season)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows to stream and write per batch',
+        )
+
+    def handle(self, *args, **options):
+        year = options.get('season')
+        self.chunk_size = options['chunk_size']
+
+        if year:
+            season = Season.objects.filter(year=year).first()
+        else:
+            season = Season.objects.filter(is_active=True).first()
+
+        if not season:
+            raise CommandError('No matching season found.')
+
+        self.stdout.write(f'Rebuilding {season}...')
+        started = timezone.now()
+
+        with transaction.atomic():
+            self.rebuild(season)
+            mark_games_scored(Game.objects.filter(week__season=season).values('id'), started)
+            transaction.on_commit(lambda: invalidate_survivor_dashboard(season.id))
+
+        self.stdout.write(self.style.SUCCESS('Rebuild complete!'))
+
+    def rebuild(self, season):
+        """Recompute pick outcomes, weekly results, season stats, survivor masks, the scoring ledger and snapshots"""
+        save_pick_outcomes(Game.objects.filter(week__season=season))
+        save_survivor_outcomes(SurvivorPick.objects.filter(week__season=season))
+
+        # Only weeks with a final game have results, the same weeks score_games --all scores
+        scored_weeks = Week.objects.filter(season=season, games__is_final=True).values('id')
+
+        # Stream picks as tuples; memory grows with users x weeks, not with picks
+        points_by_week = defaultdict(dict)
+        picks = ConfidencePick.objects.filter(
+            game__week__in=scored_weeks
+        ).values_list('game__week_id', 'user_id', 'points_awarded').iterator(chunk_size=self.chunk_size)
+
+        for week_id, user_id, points in picks:
+            week_points = points_by_week[week_id]
+            week_points[user_id] = week_points.get(user_id, 0) + points
+
+        strikes = Counter(
+            SurvivorPick.objects.filter(
+                week__season=season,
+                is_correct=False,
+            ).values_list('user_id', flat=True).iterator(chunk_size=self.chunk_size)
+        )
+
+        survivor_masks = defaultdict(int)
+        survivor_bits = SurvivorPick.objects.filter(
+            week__season=season,
+        ).values_list('user_id', 'picked_team__survivor_bit').iterator(chunk_size=self.chunk_size)
+        for user_id, bit in survivor_bits:
+            survivor_masks[user_id] |= 1 << bit
+
+        WeeklyResult.objects.filter(week__season=season).delete()
+        ScoringLedger.objects.filter(week__season=season).delete()
+
+        confidence_totals = Counter()
+        playoff_totals = defaultdict(Decimal)
+        for week_id, week_points in points_by_week.items():
+            ranks = assign_ranks(week_points)
+            results = []
+            ledger = []
+            for user_id, points in week_points.items():
+                rank, playoff_points = ranks[user_id]
+                confidence_totals[user_id] += points
+                playoff_totals[user_id] += playoff_points
+                results.append(WeeklyResult(
+                    user_id=user_id,
+                    week_id=week_id,
+                    confidence_points=points,
+                    weekly_rank=rank,
+                    playoff_points=playoff_points,
+                ))
+                ledger.append(ScoringLedger(
+                    user_id=user_id,
+                    week_id=week_id,
+                    confidence_points=points,
+                    playoff_points=playoff_points,
+                ))
+
+            WeeklyResult.objects.bulk_create(results, batch_size=self.chunk_size)
+            ScoringLedger.objects.bulk_create(ledger, batch_size=self.chunk_size)
+
+        ensure_season_stats(season, confidence_totals.keys() | survivor_masks.keys())
+
+        batch = []
+        for stats in UserSeasonStats.objects.filter(season=season).iterator(chunk_size=self.chunk_size):
+            stats.total_confidence_points = confidence_totals[stats.user_id]
+            stats.playoff_points = playoff_totals[stats.user_id]
+            stats.survivor_strikes = strikes[stats.user_id]
+            stats.is_eliminated_survivor = stats.survivor_strikes >= 3
+            stats.survivor_teams_used = survivor_masks[stats.user_id]
+            batch.append(stats)
+            if len(batch) >= self.chunk_size:
+                self.save_stats(batch)
+                batch = []
+        self.save_stats(batch)
+
+        LeaderboardSnapshot.objects.filter(week__season=season).delete()
+        write_leaderboard_snapshots(season)
+
+        self.stdout.write(
+            f'  {len(points_by_week)} weeks, {len(confidence_totals)} entrants, '
+            f'{sum(strikes.values())} survivor strikes'
+        )
+
+    def save_stats(self, batch):
+        UserSeasonStats.objects.bulk_update(
+            batch,
+            [
+                'total_confidence_points', 'playoff_points', 'survivor_strikes', 'is_eliminated_survivor',
+                'survivor_teams_used',
+            ],
+        )
@@ -1,6 +1,34 @@
+import cProfile
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
-from django.db.models import Sum, Q
-from pool.models import Week, Game, ConfidencePick, SurvivorPick, UserSeasonStats, WeeklyResult
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from pool.models import Week, ConfidencePick, UserSeasonStats, WeeklyResult
+from pool.profiling import PhaseProfiler, maybe_phase
+from pool.scoring import (
+    apply_week_to_season,
+    compute_week,
+    ensure_season_stats,
+    games_needing_scoring,
+    init_worker,
+    mark_games_scored,
+    pick_accuracy,
+    rank_week,
+    save_pick_outcomes,
+    save_weekly_results,
+    score_survivor_week,
+    unscore_week,
+    update_live_standings,
+    weekly_confidence_totals,
+    write_leaderboard_snapshots,
+    write_week,
+)
+from pool.simulation import cached_simulation
 
 
 class Command(BaseCommand):
@@ -12,175 +40,404 @@ class Command(BaseCommand):
             type=int,
             help='Score a specific week by ID',
         )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rescore every week with final games, not just games changed since the last run',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Compute weeks in parallel across N processes; results are written by a single writer',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print only a machine-readable JSON summary of each scored week',
+        )
+        parser.add_argument(
+            '--live',
+            action='store_true',
+            help='Update projected live standings for the active week (or --week-id) from in-progress scores',
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Report wall time, query count and query time for each scoring phase',
+        )
+        parser.add_argument(
+            '--profile-output',
+            help='Also write cProfile stats to this .pstats file (implies --profile)',
+        )
 
     def handle(self, *args, **options):
+        # -v 0: warnings only, 1: per-week summary, 2: per-user detail, 3: per-pick detail
+        self.verbosity = -1 if options['json'] else options['verbosity']
+        self.summaries = []
+        self.profiler = PhaseProfiler() if options['profile'] or options['profile_output'] else None
+        profile = cProfile.Profile() if options['profile_output'] else None
+
+        with ExitStack() as stack:
+            if self.profiler:
+                stack.enter_context(self.profiler.capture_queries())
+                stack.enter_context(self.profiler.phase('total'))
+            if profile:
+                profile.enable()
+                stack.callback(profile.disable)
+
+            weeks = self.score(options)
+
+        if options['json']:
+            output = {'weeks': self.summaries}
+            if self.profiler:
+                output['profile'] = self.profiler.as_dict()
+            self.stdout.write(json.dumps(output, indent=2))
+        else:
+            if weeks:
+                self.log(1, '\nScoring complete!', self.style.SUCCESS)
+            if self.profiler:
+                self.stdout.write('\n' + self.profiler.table())
+
+        if profile:
+            profile.dump_stats(options['profile_output'])
+            self.log(0, f'cProfile stats written to {options["profile_output"]}')
+
+    def score(self, options):
+        """Score the weeks selected by the options; returns them"""
         week_id = options.get('week_id')
+        started = timezone.now()
+        changed_games = None
+
+        if options['live']:
+            self.update_live(week_id)
+            return []
 
         if week_id:
             weeks = Week.objects.filter(id=week_id)
-        else:
-            # Score all weeks with final games that haven't been fully scored
+        elif options['all']:
             weeks = Week.objects.filter(games__is_final=True).distinct()
+        else:
+            # Only score games finalized or corrected since the last run
+            changed_games = list(games_needing_scoring().values_list('id', 'week_id'))
+            weeks = Week.objects.filter(id__in={week_id for _, week_id in changed_games})
+
+        weeks = list(weeks.select_related('season'))
+        if not weeks:
+            self.log(0, 'No weeks found to score.', self.style.WARNING)
+        elif options['workers'] > 1:
+            self.score_weeks_in_parallel(weeks, options['workers'])
+        else:
+            for week in weeks:
+                self.log(2, f'\nScoring {week}...')
+                # As in write_week: a failure part way through a week must not leave survivor picks
+                # marked scored without their strikes, or results without season totals
+                with self.phase('score_week'), transaction.atomic():
+                    if changed_games is None:
+                        self.score_week(week)
+                    else:
+                        self.score_week(week, self.changed_game_ids(week, changed_games))
+
+        with self.phase('mark_games_scored'):
+            for week in weeks:
+                if changed_games is None:
+                    mark_games_scored(week.games.values('id'), started)
+                else:
+                    mark_games_scored(self.changed_game_ids(week, changed_games), started)
+
+        # Standings as of each week from the earliest rescored one on may have moved
+        with self.phase('leaderboard_snapshots'):
+            first_week_numbers = {}
+            for week in weeks:
+                earliest = first_week_numbers.get(week.season, week.week_number)
+                first_week_numbers[week.season] = min(week.week_number, earliest)
+            for season, week_number in first_week_numbers.items():
+                written = write_leaderboard_snapshots(season, week_number)
+                self.log(2, f'Leaderboard snapshots for {season} from week {week_number}: {written} updated')
+
+        return weeks
+
+    def phase(self, name):
+        return maybe_phase(self.profiler, name)
+
+    def update_live(self, week_id=None):
+        """Refresh live standings; cheap enough to run on every score update"""
+        if week_id:
+            week = Week.objects.select_related('season').filter(id=week_id).first()
+        else:
+            week = Week.objects.select_related('season').filter(is_active=True).first()
 
-        if not weeks.exists():
-            self.stdout.write(self.style.WARNING('No weeks found to score.'))
+        if not week:
+            self.log(0, 'No week found for live standings.', self.style.WARNING)
             return
 
-        for week in weeks:
-            self.stdout.write(f'\nScoring {week}...')
-            self.score_week(week)
-
-        self.stdout.write(self.style.SUCCESS('\nScoring complete!'))
-
-    def score_week(self, week):
-        """Score all picks for a given week"""
+        with self.phase('update_live_standings'):
+            updated_user_ids = update_live_standings(week)
+
+        # Reuses the cached simulation unless a game went final or was corrected since it ran
+        with self.phase('simulate_week'):
+            simulation = cached_simulation(week)
+
+        self.summaries.append({
+            'week_id': week.id,
+            'week': str(week),
+            'live_users_updated': len(updated_user_ids),
+            'remaining_games': simulation['remaining_games'],
+        })
+        self.log(1, f'Live standings for {week}: {len(updated_user_ids)} users updated', self.style.SUCCESS)
+        self.log(
+            2,
+            f'  Outlook: {simulation["remaining_games"]} games left, '
+            f'{simulation["scenarios"]} scenarios simulated',
+        )
 
-        # Get all final games for this week
-        final_games = week.games.filter(is_final=True)
+    def log(self, level, message, style=None):
+        """Write a message if the command is running at `level` verbosity or higher"""
+        if self.verbosity >= level:
+            self.stdout.write(style(message) if style else message)
+
+    def changed_game_ids(self, week, changed_games):
+        return [game_id for game_id, game_week_id in changed_games if game_week_id == week.id]
+
+    def score_weeks_in_parallel(self, weeks, workers):
+        """Compute whole weeks across a process pool, then write them one at a time"""
+        # Workers open their own connections; don't let them inherit ours
+        connections.close_all()
+
+        # Worker queries happen in other processes and aren't counted by --profile
+        with self.phase('compute_week (workers)'):
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                computed_weeks = list(pool.map(compute_week, [week.id for week in weeks]))
+
+        # A single writer avoids SQLite write contention
+        for week, computed in zip(weeks, computed_weeks):
+            self.log(2, f'\nScoring {week}...')
+            with self.phase('write_week'), transaction.atomic():
+                deltas, struck_user_ids = write_week(week, computed)
+
+            # The same detail, in the same order, as score_week() prints at each verbosity
+            ranked_results = WeeklyResult.objects.filter(week=week).annotate(
+                email=F('user__email'),
+            ).order_by('weekly_rank', 'email')
+            if computed['final']:
+                if self.verbosity >= 3:
+                    self.log_picks(week)
+                if self.verbosity >= 2:
+                    self.log_rankings(ranked_results)
+                self.log_deltas(deltas)
+            survivor_picks = computed['survivor_picks']
+            strikes = self.log_survivor_picks(week, survivor_picks, computed['unmatched_picks'], struck_user_ids)
+
+            if not computed['final'] and not (deltas or survivor_picks):
+                self.log(0, f'  No final games for {week}', self.style.WARNING)
+                continue
+            self.report_week(
+                week,
+                users_scored=len(computed['points']),
+                deltas=deltas,
+                top=[
+                    (result.weekly_rank, result.email, result.confidence_points, result.playoff_points)
+                    for result in (ranked_results[:3] if computed['final'] else [])
+                ],
+                survivor_picks=survivor_picks,
+                strikes=strikes,
+            )
 
-        if not final_games.exists():
-            self.stdout.write(self.style.WARNING(f'  No final games for {week}'))
+    def score_week(self, week, game_ids=None):
+        """Score all picks for a given week, or only the picks of users who picked game_ids"""
+
+        # A week with no final games gets no results; any it had (its last final game was
+        # un-finalized) are backed out rather than ranked with everyone tied at 0
+        if not week.games.filter(is_final=True).exists():
+            with self.phase('unscore_week'):
+                deltas = unscore_week(week)
+                scored_picks, strikes = self.score_survivor_picks(week, game_ids)
+            if deltas or scored_picks:
+                self.report_week(
+                    week, users_scored=0, deltas=deltas, top=[], survivor_picks=scored_picks, strikes=strikes,
+                )
+            else:
+                self.log(0, f'  No final games for {week}', self.style.WARNING)
             return
 
-        # Score confidence picks
-        confidence_picks = ConfidencePick.objects.filter(
-            game__in=final_games
-        ).select_related('user', 'game', 'picked_team')
+        with self.phase('confidence_totals'):
+            # Store each pick's outcome, then total the affected users' points in a single aggregate query
+            save_pick_outcomes(week.games.all() if game_ids is None else game_ids)
+            points_by_user = weekly_confidence_totals(week, game_ids)
 
-        points_by_user = {}
+            if self.verbosity >= 3:
+                self.log_picks(week, game_ids)
 
-        for pick in confidence_picks:
-            if pick.user not in points_by_user:
-                points_by_user[pick.user] = 0
+            # Make sure every scored user has season stats before ranking
+            ensure_season_stats(week.season, points_by_user)
 
-            if pick.is_correct():
-                points_by_user[pick.user] += pick.confidence_points
-                self.stdout.write(
-                    f'  ✓ {pick.user.email}: +{pick.confidence_points} pts for {pick.picked_team.abbreviation}'
-                )
-            else:
-                self.stdout.write(
-                    f'  ✗ {pick.user.email}: 0 pts (picked {pick.picked_team.abbreviation})'
-                )
-
-        # Create or update weekly results
-        for user, points in points_by_user.items():
-            weekly_result, created = WeeklyResult.objects.get_or_create(
-                user=user,
-                week=week,
-                defaults={'confidence_points': points}
-            )
-            if not created:
-                weekly_result.confidence_points = points
-                weekly_result.save()
+            # Create or update weekly results
+            save_weekly_results(week, points_by_user)
 
         # Calculate weekly rankings and playoff points
-        self.calculate_weekly_rankings(week)
+        with self.phase('calculate_weekly_rankings'):
+            ranked_results = self.calculate_weekly_rankings(week)
 
-        # Update user season stats for confidence points
-        for user, points in points_by_user.items():
-            stats, created = UserSeasonStats.objects.get_or_create(
-                user=user,
-                season=week.season
-            )
-
-            # Add points for this week
-            stats.total_confidence_points += points
-            stats.save()
+        # Apply only what changed since this week was last scored to season stats
+        with self.phase('season_stats'):
+            deltas = apply_week_to_season(week)
 
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'  Updated {user.email}: +{points} pts (Total: {stats.total_confidence_points})'
-                )
-            )
+        self.log_deltas(deltas)
 
         # Score survivor picks
-        self.score_survivor_picks(week, final_games)
+        with self.phase('score_survivor_picks'):
+            scored_picks, strikes = self.score_survivor_picks(week, game_ids)
+
+        self.report_week(
+            week,
+            users_scored=len(points_by_user),
+            deltas=deltas,
+            top=[
+                (result.weekly_rank, result.email, result.confidence_points, result.playoff_points)
+                for result in ranked_results[:3]
+            ],
+            survivor_picks=scored_picks,
+            strikes=strikes,
+        )
+
+    def log_picks(self, week, game_ids=None):
+        """Per-pick detail for -v 3"""
+        picks = ConfidencePick.objects.filter(game__week=week, is_correct__isnull=False)
+        if game_ids is not None:
+            picks = picks.filter(user__in=ConfidencePick.objects.filter(game__in=game_ids).values('user'))
+
+        for email, team, confidence_points, is_correct in picks.order_by(
+            'user__email', 'game__game_time'
+        ).values_list('user__email', 'picked_team__abbreviation', 'confidence_points', 'is_correct').iterator():
+            if is_correct:
+                self.log(3, f'  ✓ {email}: +{confidence_points} pts for {team}')
+            else:
+                self.log(3, f'  ✗ {email}: 0 pts (picked {team})')
 
     def calculate_weekly_rankings(self, week):
         """Calculate weekly rankings and award playoff points"""
-        # Playoff points based on weekly rank
-        PLAYOFF_POINTS = {
-            1: 20, 2: 15, 3: 14, 4: 13, 5: 12, 6: 11, 7: 10, 8: 9,
-            9: 8, 10: 7, 11: 6, 12: 5, 13: 4, 14: 3, 15: 2, 16: 1
-        }
-
-        # Get all weekly results for this week, ordered by points (desc)
-        weekly_results = WeeklyResult.objects.filter(week=week).order_by('-confidence_points', 'user__email')
-
-        self.stdout.write(f'\n  📊 Weekly Rankings:')
-
-        rank = 1
-        for result in weekly_results:
-            result.weekly_rank = rank
-            result.playoff_points = PLAYOFF_POINTS.get(rank, 0)
-            result.save()
-
-            # Update season playoff points
-            stats = UserSeasonStats.objects.get(user=result.user, season=week.season)
-            stats.playoff_points += result.playoff_points
-            stats.save()
+        ranked_results = rank_week(week)
+        if self.verbosity >= 2:
+            self.log_rankings(ranked_results)
+        return ranked_results
+
+    def log_rankings(self, ranked_results):
+        """Per-user weekly ranks for -v 2"""
+        self.log(2, f'\n  📊 Weekly Rankings:')
+        for result in ranked_results:
+            self.log(
+                2,
+                f'    #{result.weekly_rank} {result.email}: {result.confidence_points} pts '
+                f'→ +{float(result.playoff_points):g} playoff pts',
+                self.style.SUCCESS,
+            )
 
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'    #{rank} {result.user.email}: {result.confidence_points} pts → +{result.playoff_points} playoff pts'
-                )
+    def log_deltas(self, deltas):
+        """Per-user season total changes for -v 2"""
+        if self.verbosity < 2:
+            return
+        emails = dict(User.objects.filter(id__in=list(deltas)).values_list('id', 'email'))
+        for user_id, (confidence_delta, playoff_delta) in deltas.items():
+            self.log(
+                2,
+                f'  Updated {emails[user_id]}: {confidence_delta:+d} pts, {float(playoff_delta):+g} playoff pts',
+                self.style.SUCCESS,
             )
 
-            rank += 1
+    def score_survivor_picks(self, week, game_ids=None):
+        """Rescore survivor picks and recount strikes; returns (changed picks, strike details)"""
+        scored_picks, unmatched_picks, struck_user_ids = score_survivor_week(week, game_ids)
+        return scored_picks, self.log_survivor_picks(week, scored_picks, unmatched_picks, struck_user_ids)
+
+    def log_survivor_picks(self, week, scored_picks, unmatched_picks, struck_user_ids):
+        """Warn about unmatched survivor picks and list the winners for -v 2; returns the strike details"""
+        for pick in unmatched_picks:
+            self.log(
+                0,
+                f'  No final game found for survivor pick: {pick.email} - {pick.team}',
+                self.style.WARNING,
+            )
 
-    def score_survivor_picks(self, week, final_games):
-        """Score survivor picks and track strikes"""
+        strikes = self.strike_details(week, scored_picks, struck_user_ids)
 
-        survivor_picks = SurvivorPick.objects.filter(
-            week=week
-        ).select_related('user', 'picked_team')
+        if self.verbosity >= 2:
+            for pick in scored_picks:
+                if pick.is_correct:
+                    self.log(2, f'  ✓ Survivor: {pick.email} - {pick.team} won', self.style.SUCCESS)
 
-        for pick in survivor_picks:
-            # Check if pick has already been scored
-            if pick.is_correct is not None:
-                continue
+        return strikes
 
-            # Find the game where the picked team played
-            team_game = final_games.filter(
-                Q(home_team=pick.picked_team) | Q(away_team=pick.picked_team)
-            ).first()
+    def strike_details(self, week, scored_picks, struck_user_ids):
+        """One dict per losing survivor pick, with the user's strike count after scoring"""
+        if not struck_user_ids:
+            return []
 
-            if not team_game:
-                self.stdout.write(
-                    self.style.WARNING(
-                        f'  No final game found for survivor pick: {pick.user.email} - {pick.picked_team.abbreviation}'
-                    )
-                )
-                continue
+        stats = {
+            user_id: (survivor_strikes, is_eliminated)
+            for user_id, survivor_strikes, is_eliminated in UserSeasonStats.objects.filter(
+                season=week.season,
+                user_id__in=list(struck_user_ids),
+            ).values_list('user_id', 'survivor_strikes', 'is_eliminated_survivor')
+        }
 
-            winner = team_game.winner()
-            pick.is_correct = (winner == pick.picked_team)
-            pick.save()
+        strikes = []
+        for pick in scored_picks:
+            if pick.is_correct is False:
+                survivor_strikes, is_eliminated = stats[pick.user_id]
+                strikes.append({
+                    'email': pick.email,
+                    'team': pick.team,
+                    'strikes': survivor_strikes,
+                    'eliminated': is_eliminated,
+                })
+        return strikes
+
+    def report_week(self, week, users_scored, deltas, top, survivor_picks, strikes):
+        """Record the week's summary for --json and print it"""
+        picks_scored, correct_picks = pick_accuracy(week)
+
+        # Only report users whose strikes this week took them out
+        week_strikes = Counter(strike['email'] for strike in strikes)
+        eliminated = sorted({
+            strike['email'] for strike in strikes
+            if strike['eliminated'] and strike['strikes'] - week_strikes[strike['email']] < 3
+        })
+
+        summary = {
+            'week_id': week.id,
+            'week': str(week),
+            'users_scored': users_scored,
+            'season_totals_changed': len(deltas),
+            'picks_scored': picks_scored,
+            'correct_picks': correct_picks,
+            'correct_pick_rate': round(correct_picks / picks_scored, 4) if picks_scored else None,
+            'top': [
+                {'rank': rank, 'email': email, 'points': points, 'playoff_points': float(playoff_points)}
+                for rank, email, points, playoff_points in top
+            ],
+            'survivor_picks_scored': len(survivor_picks),
+            'survivor_strikes': strikes,
+            'eliminated': eliminated,
+        }
+        self.summaries.append(summary)
 
-            # Update user stats
-            stats, created = UserSeasonStats.objects.get_or_create(
-                user=pick.user,
-                season=week.season
+        for strike in strikes:
+            self.log(
+                2,
+                f'  ⚠ SURVIVOR STRIKE: {strike["email"]} - {strike["team"]} lost (Strikes: {strike["strikes"]}/3)',
+                self.style.ERROR,
             )
 
-            if not pick.is_correct:
-                stats.add_survivor_strike()
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'  ⚠ SURVIVOR STRIKE: {pick.user.email} - {pick.picked_team.abbreviation} lost '
-                        f'(Strikes: {stats.survivor_strikes}/3)'
-                    )
-                )
-                if stats.is_eliminated_survivor:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f'  💀 {pick.user.email} ELIMINATED from survivor pool!'
-                        )
-                    )
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'  ✓ Survivor: {pick.user.email} - {pick.picked_team.abbreviation} won'
-                    )
-                )
+        self.log(1, f'\n{week}')
+        self.log(1, f'  Users scored: {users_scored} ({len(deltas)} season totals changed)')
+        if picks_scored:
+            self.log(1, f'  Correct picks: {correct_picks}/{picks_scored} ({correct_picks / picks_scored:.1%})')
+        if top:
+            self.log(1, '  Top 3: ' + ', '.join(f'#{rank} {email} ({points} pts)' for rank, email, points, _ in top))
+        self.log(
+            1,
+            f'  Survivor: {len(survivor_picks)} picks scored, {len(strikes)} new strikes',
+            self.style.ERROR if strikes else self.style.SUCCESS,
+        )
+        for email in eliminated:
+            self.log(1, f'  💀 {email} ELIMINATED from survivor pool!', self.style.ERROR)
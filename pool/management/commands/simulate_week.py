@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from pool.models import Week
+from pool.simulation import DEFAULT_SAMPLES, cached_simulation, simulate_week
+
+
+class Command(BaseCommand):
+    help = "Simulate the week's remaining games and report each user's chance of placing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--week-id',
+            type=int,
+            help='Simulate a specific week by ID (defaults to the active week)',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=DEFAULT_SAMPLES,
+            help='Scenarios to sample when too many games remain to enumerate them all',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed for sampled scenarios',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of users to list',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Ignore any cached simulation for the current results',
+        )
+
+    def handle(self, *args, **options):
+        week_id = options.get('week_id')
+        if week_id:
+            week = Week.objects.filter(id=week_id).first()
+        else:
+            week = Week.objects.filter(is_active=True).first()
+
+        if not week:
+            raise CommandError('No week found to simulate.')
+
+        if options['force']:
+            simulation = simulate_week(week, samples=options['samples'], seed=options['seed'])
+        else:
+            simulation = cached_simulation(week, samples=options['samples'], seed=options['seed'])
+
+        kind = 'possible' if simulation['exhaustive'] else 'sampled'
+        self.stdout.write(
+            f'{week}: {simulation["remaining_games"]} games remaining, '
+            f'{simulation["scenarios"]} {kind} scenarios'
+        )
+
+        users = sorted(
+            simulation['users'].items(),
+            key=lambda item: (-item[1]['win'], -item[1]['expected_playoff_points']),
+        )[:options['top']]
+        emails = dict(User.objects.filter(id__in=[user_id for user_id, _ in users]).values_list('id', 'email'))
+
+        self.stdout.write(f'{"Player":<36}{"Win":>8}{"Top 3":>8}{"Paid":>8}{"Exp. pts":>10}')
+        for user_id, outlook in users:
+            self.stdout.write(
+                f'{emails.get(user_id, user_id):<36}{outlook["win"]:>8.1%}'
+                f'{sum(outlook["slots"][:3]):>8.1%}{outlook["paid"]:>8.1%}'
+                f'{outlook["expected_playoff_points"]:>10.2f}'
+            )
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """Existing weekly results have already been added to season totals"""
+    WeeklyResult = apps.get_model('pool', 'WeeklyResult')
+    ScoringLedger = apps.get_model('pool', 'ScoringLedger')
+    ScoringLedger.objects.bulk_create(
+        ScoringLedger(
+            user_id=result.user_id,
+            week_id=result.week_id,
+            confidence_points=result.confidence_points,
+            playoff_points=result.playoff_points,
+        )
+        for result in WeeklyResult.objects.all()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0002_alter_userseasonstats_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoringLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('confidence_points', models.IntegerField(default=0)),
+                ('playoff_points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scoring_ledger', to=settings.AUTH_USER_MODEL)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scoring_ledger', to='pool.week')),
+            ],
+            options={
+                'ordering': ['week', 'user'],
+                'unique_together': {('user', 'week')},
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0003_scoringledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='scored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
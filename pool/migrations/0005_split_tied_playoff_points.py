@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0004_game_change_tracking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scoringledger',
+            name='playoff_points',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='userseasonstats',
+            name='playoff_points',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='weeklyresult',
+            name='playoff_points',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+    ]
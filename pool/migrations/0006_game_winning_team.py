@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_winning_team(apps, schema_editor):
+    Game = apps.get_model('pool', 'Game')
+    final_games = Game.objects.filter(is_final=True, home_score__isnull=False, away_score__isnull=False)
+    final_games.filter(home_score__gt=F('away_score')).update(winning_team=F('home_team'))
+    final_games.filter(away_score__gt=F('home_score')).update(winning_team=F('away_team'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0005_split_tied_playoff_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='winning_team',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='won_games', to='pool.team'),
+        ),
+        migrations.RunPython(backfill_winning_team, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:07
+
+from django.db import migrations, models
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+
+
+def backfill_pick_outcomes(apps, schema_editor):
+    Game = apps.get_model('pool', 'Game')
+    ConfidencePick = apps.get_model('pool', 'ConfidencePick')
+    won = Exists(Game.objects.filter(id=OuterRef('game_id'), winning_team_id=OuterRef('picked_team_id')))
+    ConfidencePick.objects.filter(game__is_final=True).update(
+        is_correct=Case(When(won, then=Value(True)), default=Value(False)),
+        points_awarded=Case(When(won, then=F('confidence_points')), default=Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0006_game_winning_team'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='confidencepick',
+            name='is_correct',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='confidencepick',
+            name='points_awarded',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_pick_outcomes, migrations.RunPython.noop),
+    ]
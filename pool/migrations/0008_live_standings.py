@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0007_confidencepick_outcome'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='projected_winner',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pool.team'),
+        ),
+        migrations.CreateModel(
+            name='LiveStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('projected_points', models.IntegerField(default=0)),
+                ('projected_rank', models.IntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='live_standings', to=settings.AUTH_USER_MODEL)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='live_standings', to='pool.week')),
+            ],
+            options={
+                'ordering': ['week', 'projected_rank'],
+                'unique_together': {('user', 'week')},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:20
+
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def backfill_survivor_masks(apps, schema_editor):
+    Team = apps.get_model('pool', 'Team')
+    SurvivorPick = apps.get_model('pool', 'SurvivorPick')
+    UserSeasonStats = apps.get_model('pool', 'UserSeasonStats')
+
+    teams = list(Team.objects.order_by('id'))
+    for bit, team in enumerate(teams):
+        team.survivor_bit = bit
+    Team.objects.bulk_update(teams, ['survivor_bit'])
+
+    bits = {team.id: team.survivor_bit for team in teams}
+    masks = defaultdict(int)
+    for user_id, season_id, team_id in SurvivorPick.objects.values_list('user_id', 'week__season_id', 'picked_team_id'):
+        masks[user_id, season_id] |= 1 << bits[team_id]
+
+    UserSeasonStats.objects.bulk_create(
+        [UserSeasonStats(user_id=user_id, season_id=season_id) for user_id, season_id in masks],
+        ignore_conflicts=True,
+    )
+    stats = list(UserSeasonStats.objects.all())
+    for row in stats:
+        row.survivor_teams_used = masks.get((row.user_id, row.season_id), 0)
+    UserSeasonStats.objects.bulk_update(stats, ['survivor_teams_used'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0008_live_standings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='survivor_bit',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='userseasonstats',
+            name='survivor_teams_used',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_survivor_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0009_survivor_team_mask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('season_rank', models.IntegerField()),
+                ('playoff_points', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('total_confidence_points', models.IntegerField(default=0)),
+                ('rank_change', models.IntegerField(blank=True, null=True)),
+                ('playoff_points_change', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_snapshots', to=settings.AUTH_USER_MODEL)),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_snapshots', to='pool.week')),
+            ],
+            options={
+                'ordering': ['week', 'season_rank'],
+                'unique_together': {('user', 'week')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0010_leaderboard_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userseasonstats',
+            index=models.Index(fields=['season', '-playoff_points', '-total_confidence_points', '-id'], name='stats_leaderboard_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-17 19:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0011_leaderboard_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='confidencepick',
+            index=models.Index(fields=['game', 'user'], name='pick_game_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='survivorpick',
+            index=models.Index(fields=['user', 'week'], name='survivor_user_week_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='week',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['season', 'week_number'], name='week_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyresult',
+            index=models.Index(fields=['week', '-confidence_points'], name='result_week_points_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0012_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livestanding',
+            index=models.Index(fields=['week', 'projected_rank', 'id'], name='live_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_projected_winners(apps, schema_editor):
+    Game = apps.get_model('pool', 'Game')
+    LiveLeader = apps.get_model('pool', 'LiveLeader')
+    LiveLeader.objects.bulk_create([
+        LiveLeader(game_id=game_id, team_id=team_id)
+        for game_id, team_id in Game.objects.filter(
+            projected_winner__isnull=False,
+        ).values_list('id', 'projected_winner_id').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool', '0013_live_standing_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveLeader',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='live_leader', serialize=False, to='pool.game')),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pool.team')),
+            ],
+        ),
+        migrations.RunPython(copy_projected_winners, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='game',
+            name='projected_winner',
+        ),
+    ]
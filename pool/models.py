@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -24,6 +25,10 @@ class Week(models.Model):
     class Meta:
         ordering = ['season', 'week_number']
         unique_together = ['season', 'week_number']
+        indexes = [
+            # Only the active week is ever looked up by this flag, so index just that row
+            models.Index(fields=['season', 'week_number'], condition=models.Q(is_active=True), name='week_active_idx'),
+        ]
 
     def __str__(self):
         return f"{self.season.year} - Week {self.week_number}"
@@ -33,10 +38,16 @@ class Week(models.Model):
         return 2 if self.week_number % 2 == 0 else 1
 
 
+# Survivor team usage is stored as one bit per team, so a season's teams must fit in the mask
+SURVIVOR_MASK_BITS = 32
+
+
 class Team(models.Model):
     name = models.CharField(max_length=100)
     abbreviation = models.CharField(max_length=10, unique=True)
     city = models.CharField(max_length=100)
+    # Position of this team in UserSeasonStats.survivor_teams_used; assigned once, never reused
+    survivor_bit = models.PositiveSmallIntegerField(unique=True, null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['city', 'name']
@@ -44,6 +55,29 @@ class Team(models.Model):
     def __str__(self):
         return f"{self.city} {self.name}"
 
+    def save(self, *args, **kwargs):
+        if self.survivor_bit is None:
+            used_bits = set(Team.objects.exclude(survivor_bit=None).values_list('survivor_bit', flat=True))
+            free_bits = [bit for bit in range(SURVIVOR_MASK_BITS) if bit not in used_bits]
+            if not free_bits:
+                raise ValueError(f"Survivor masks hold at most {SURVIVOR_MASK_BITS} teams")
+            self.survivor_bit = free_bits[0]
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'survivor_bit'}
+        super().save(*args, **kwargs)
+
+    @property
+    def survivor_mask(self):
+        return 1 << self.survivor_bit
+
+
+def survivor_mask(teams):
+    """Mask with the survivor bit of each team set"""
+    mask = 0
+    for team in teams:
+        mask |= team.survivor_mask
+    return mask
+
 
 class Game(models.Model):
     SATURDAY = 'SAT'
@@ -64,6 +98,16 @@ class Game(models.Model):
     home_score = models.IntegerField(null=True, blank=True)
     away_score = models.IntegerField(null=True, blank=True)
     is_final = models.BooleanField(default=False)
+    # Denormalized from the result fields on save; null until final and for ties
+    winning_team = models.ForeignKey(
+        Team, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='won_games'
+    )
+
+    # Change tracking: a game needs (re)scoring when it was updated after it was last scored
+    updated_at = models.DateTimeField(auto_now=True)
+    scored_at = models.DateTimeField(null=True, blank=True)
+
+    RESULT_FIELDS = {'home_score', 'away_score', 'is_final', 'home_team', 'home_team_id', 'away_team', 'away_team_id'}
 
     class Meta:
         ordering = ['game_time']
@@ -71,22 +115,52 @@ class Game(models.Model):
     def __str__(self):
         return f"{self.away_team.abbreviation} @ {self.home_team.abbreviation} - {self.week}"
 
-    def winner(self):
-        """Returns the winning team or None if game not final"""
+    def save(self, *args, **kwargs):
+        self.winning_team_id = self.compute_winning_team_id()
+
+        # auto_now is only written for fields named in update_fields, and scoring keys off updated_at
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.RESULT_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'winning_team', 'updated_at'}
+
+        super().save(*args, **kwargs)
+
+    def compute_winning_team_id(self):
+        """Returns the id of the team that won, or None if the game is not final or tied"""
         if not self.is_final or self.home_score is None or self.away_score is None:
             return None
         if self.home_score > self.away_score:
-            return self.home_team
+            return self.home_team_id
         elif self.away_score > self.home_score:
-            return self.away_team
+            return self.away_team_id
         return None  # Tie (rare but possible)
 
+    def winner(self):
+        """Returns the winning team or None if game not final"""
+        return self.winning_team
+
+
+class LiveLeader(models.Model):
+    """Team ahead in a game when live standings were last updated; maintained by score_games --live
+
+    Kept off Game so that saving a Game loaded before a live update cannot roll the leader back.
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='live_leader')
+    # Null while the game is level
+    team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    def __str__(self):
+        return f"{self.game} - Leader: {self.team.abbreviation if self.team else 'level'}"
+
 
 class ConfidencePick(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='confidence_picks')
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='confidence_picks')
     picked_team = models.ForeignKey(Team, on_delete=models.CASCADE)
     confidence_points = models.IntegerField(validators=[MinValueValidator(1)])
+    # Set by scoring: None until the game is final
+    is_correct = models.BooleanField(null=True, blank=True)
+    points_awarded = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -94,17 +168,14 @@ class ConfidencePick(models.Model):
         unique_together = [
             ['user', 'game'],  # One pick per game per user
         ]
+        indexes = [
+            # Users who picked a given set of games, for incremental scoring
+            models.Index(fields=['game', 'user'], name='pick_game_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.game} - {self.picked_team.abbreviation} ({self.confidence_points})"
 
-    def is_correct(self):
-        """Check if this pick was correct"""
-        if not self.game.is_final:
-            return None
-        winner = self.game.winner()
-        return winner == self.picked_team if winner else False
-
 
 class SurvivorPick(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='survivor_picks')
@@ -115,6 +186,9 @@ class SurvivorPick(models.Model):
 
     class Meta:
         ordering = ['week', 'user']
+        indexes = [
+            models.Index(fields=['user', 'week'], name='survivor_user_week_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.week} - Survivor: {self.picked_team.abbreviation}"
@@ -126,15 +200,36 @@ class UserSeasonStats(models.Model):
     survivor_strikes = models.IntegerField(default=0, validators=[MinValueValidator(0), MaxValueValidator(3)])
     is_eliminated_survivor = models.BooleanField(default=False)
     total_confidence_points = models.IntegerField(default=0)
-    playoff_points = models.IntegerField(default=0)
+    playoff_points = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    # Team.survivor_bit is set for every team used in a survivor pick this season
+    survivor_teams_used = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ['user', 'season']
         ordering = ['-playoff_points', '-total_confidence_points']
+        indexes = [
+            # Keyset pagination of the leaderboard walks this index in either direction
+            models.Index(
+                fields=['season', '-playoff_points', '-total_confidence_points', '-id'],
+                name='stats_leaderboard_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.season.year} - Playoff: {self.playoff_points} pts"
 
+    def has_used_survivor_team(self, team):
+        return bool(self.survivor_teams_used & team.survivor_mask)
+
+    def replace_survivor_teams(self, old_teams, new_teams):
+        """Swap one week's survivor teams in the used-teams mask"""
+        UserSeasonStats.objects.filter(pk=self.pk).update(
+            survivor_teams_used=F('survivor_teams_used').bitand(~survivor_mask(old_teams)).bitor(
+                survivor_mask(new_teams)
+            )
+        )
+        self.refresh_from_db(fields=['survivor_teams_used'])
+
     def add_survivor_strike(self):
         """Add a strike and check if user should be eliminated"""
         self.survivor_strikes += 1
@@ -148,11 +243,71 @@ class WeeklyResult(models.Model):
     week = models.ForeignKey(Week, on_delete=models.CASCADE, related_name='weekly_results')
     confidence_points = models.IntegerField(default=0)
     weekly_rank = models.IntegerField(null=True, blank=True)
-    playoff_points = models.IntegerField(default=0)
+    # Tied users split the playoff points for the ranks they share, so these can be fractional
+    playoff_points = models.DecimalField(max_digits=6, decimal_places=2, default=0)
 
     class Meta:
         unique_together = ['user', 'week']
         ordering = ['week', '-confidence_points']
+        indexes = [
+            models.Index(fields=['week', '-confidence_points'], name='result_week_points_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.week} - Rank: {self.weekly_rank} - {self.playoff_points} playoff pts"
+
+
+class ScoringLedger(models.Model):
+    """What a scored week last contributed to a user's season totals"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scoring_ledger')
+    week = models.ForeignKey(Week, on_delete=models.CASCADE, related_name='scoring_ledger')
+    confidence_points = models.IntegerField(default=0)
+    playoff_points = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'week']
+        ordering = ['week', 'user']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.week} - Applied: {self.confidence_points} pts, {self.playoff_points} playoff pts"
+
+
+class LeaderboardSnapshot(models.Model):
+    """Season standings as of the end of a scored week"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_snapshots')
+    week = models.ForeignKey(Week, on_delete=models.CASCADE, related_name='leaderboard_snapshots')
+    season_rank = models.IntegerField()
+    playoff_points = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    total_confidence_points = models.IntegerField(default=0)
+    # Places gained since the previous week (negative when dropping); null in a user's first week
+    rank_change = models.IntegerField(null=True, blank=True)
+    playoff_points_change = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'week']
+        ordering = ['week', 'season_rank']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.week} - Season rank: {self.season_rank}"
+
+
+class LiveStanding(models.Model):
+    """Projected weekly total and rank while games are in progress"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='live_standings')
+    week = models.ForeignKey(Week, on_delete=models.CASCADE, related_name='live_standings')
+    projected_points = models.IntegerField(default=0)
+    projected_rank = models.IntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'week']
+        ordering = ['week', 'projected_rank']
+        indexes = [
+            # Keyset pagination of the live standings walks this index in either direction
+            models.Index(fields=['week', 'projected_rank', 'id'], name='live_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.week} - Projected: {self.projected_points} pts (#{self.projected_rank})"
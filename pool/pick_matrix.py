@@ -0,0 +1,88 @@
+import numpy as np
+from .models import ConfidencePick
+
+# Values in PickMatrix.side and in outcome vectors
+HOME = 1
+AWAY = 0
+NO_RESULT = -1  # outcome: tie or not yet decided; side: no pick
+
+
+class PickMatrix:
+    """A week's confidence picks as compact users x games arrays
+
+    side[u, g] is HOME, AWAY or NO_RESULT (no pick) and confidence[u, g] is the pick's
+    weight (0 when there is no pick). Outcome vectors use HOME/AWAY for the winning side
+    and NO_RESULT for ties or undecided games, so a vector of outcomes scores every
+    user at once and a matrix of outcomes scores many hypothetical weeks at once.
+    """
+
+    def __init__(self, user_ids, game_ids, home_team_ids, away_team_ids, side, confidence):
+        self.user_ids = user_ids
+        self.game_ids = game_ids
+        self.home_team_ids = home_team_ids
+        self.away_team_ids = away_team_ids
+        self.side = side
+        self.confidence = confidence
+
+        # Points each user earns if the home / away side wins each game
+        self.home_weights = np.where(side == HOME, confidence, 0).astype(np.float32)
+        self.away_weights = np.where(side == AWAY, confidence, 0).astype(np.float32)
+
+    @classmethod
+    def for_week(cls, week):
+        """Load the week's games and all of its confidence picks (one query each)"""
+        games = np.array(
+            week.games.order_by('game_time', 'id').values_list('id', 'home_team_id', 'away_team_id'),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        picks = np.array(
+            ConfidencePick.objects.filter(game__week=week).values_list(
+                'user_id', 'game_id', 'picked_team_id', 'confidence_points'
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 4)
+
+        game_ids = games[:, 0]
+        user_ids, user_index = np.unique(picks[:, 0], return_inverse=True)
+
+        # Column of each pick's game in schedule order
+        order = np.argsort(game_ids)
+        game_index = order[np.searchsorted(game_ids, picks[:, 1], sorter=order)]
+
+        side = np.full((len(user_ids), len(game_ids)), NO_RESULT, dtype=np.int8)
+        confidence = np.zeros((len(user_ids), len(game_ids)), dtype=np.int8)
+        side[user_index, game_index] = np.where(picks[:, 2] == games[game_index, 1], HOME, AWAY)
+        confidence[user_index, game_index] = picks[:, 3]
+
+        return cls(user_ids, game_ids, games[:, 1], games[:, 2], side, confidence)
+
+    @property
+    def num_users(self):
+        return len(self.user_ids)
+
+    @property
+    def num_games(self):
+        return len(self.game_ids)
+
+    def outcome_vector(self, winners):
+        """Outcome vector from {game_id: winning team id}; missing games and None winners are NO_RESULT"""
+        outcomes = np.full(self.num_games, NO_RESULT, dtype=np.int8)
+        for column, game_id in enumerate(self.game_ids):
+            winner_id = winners.get(int(game_id))
+            if winner_id == self.home_team_ids[column]:
+                outcomes[column] = HOME
+            elif winner_id == self.away_team_ids[column]:
+                outcomes[column] = AWAY
+        return outcomes
+
+    def score(self, outcomes):
+        """Points per user (aligned with user_ids) for one outcome vector"""
+        return self.score_many(np.asarray(outcomes)[np.newaxis, :])[0]
+
+    def score_many(self, outcomes):
+        """Points per scenario and user (scenarios x users) for a matrix of outcome vectors"""
+        outcomes = np.asarray(outcomes, dtype=np.int8)
+        home_won = (outcomes == HOME).astype(np.float32)
+        away_won = (outcomes == AWAY).astype(np.float32)
+        points = home_won @ self.home_weights.T + away_won @ self.away_weights.T
+        return points.astype(np.int32)
@@ -0,0 +1,89 @@
+from django.db import transaction
+from .models import ConfidencePick, Game, SurvivorPick, Team
+from .survivor import invalidate_survivor_dashboard
+
+BEARS_ABBREVIATION = 'CHI'
+
+
+class WeekContext:
+    """A week's games, the teams and one user's existing picks, loaded once per picks request
+
+    make_picks, WeekPicksForm, SurvivorPickForm and the template all read from the same
+    instance, so a picks page costs the same few queries whatever the number of games.
+    """
+
+    def __init__(self, week, user):
+        self.week = week
+        self.user = user
+        self.games = list(
+            Game.objects.filter(week=week).select_related('home_team', 'away_team').order_by('game_time')
+        )
+        self.teams = {team.id: team for team in Team.objects.order_by('city', 'name')}
+        self.bears = next((team for team in self.teams.values() if team.abbreviation == BEARS_ABBREVIATION), None)
+
+        self.confidence_picks = {}
+        self.survivor_picks = []
+        if user:
+            self.confidence_picks = {
+                pick.game_id: pick for pick in ConfidencePick.objects.filter(user=user, game__week=week)
+            }
+            self.survivor_picks = list(SurvivorPick.objects.filter(user=user, week=week).order_by('id'))
+
+    def initial_data(self):
+        """Form initial values from the user's existing picks"""
+        initial = {}
+        for game_id, pick in self.confidence_picks.items():
+            initial[f'game_{game_id}_team'] = pick.picked_team_id
+            initial[f'game_{game_id}_confidence'] = pick.confidence_points
+        for i, pick in enumerate(self.survivor_picks):
+            initial[f'survivor_pick_{i+1}'] = pick.picked_team_id
+        return initial
+
+    def survivor_teams(self):
+        """Teams of the user's existing survivor picks for the week"""
+        return [self.teams[pick.picked_team_id] for pick in self.survivor_picks]
+
+    def save_picks(self, picks, survivor_teams, stats):
+        """Write a submitted sheet over the stored one, touching only the picks that changed
+
+        `picks` maps game id to (picked team id, confidence points). Changed and new confidence
+        picks go in one upsert, so unchanged rows keep their created_at. All writes share one
+        transaction: a failed save leaves the previous sheet intact. Returns the rows written.
+        """
+        changed = []
+        for game_id, (team_id, points) in picks.items():
+            existing = self.confidence_picks.get(game_id)
+            if existing is None or (existing.picked_team_id, existing.confidence_points) != (team_id, points):
+                changed.append(ConfidencePick(
+                    user=self.user,
+                    game_id=game_id,
+                    picked_team_id=team_id,
+                    confidence_points=points,
+                ))
+
+        new_team_ids = {team.id for team in survivor_teams}
+        old_team_ids = {pick.picked_team_id for pick in self.survivor_picks}
+        dropped = [pick.id for pick in self.survivor_picks if pick.picked_team_id not in new_team_ids]
+        added = [team for team in survivor_teams if team.id not in old_team_ids]
+
+        if not (changed or dropped or added):
+            return 0
+
+        with transaction.atomic():
+            if changed:
+                ConfidencePick.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=['user', 'game'],
+                    update_fields=['picked_team', 'confidence_points', 'updated_at'],
+                )
+            if dropped:
+                SurvivorPick.objects.filter(id__in=dropped).delete()
+            if added:
+                SurvivorPick.objects.bulk_create([
+                    SurvivorPick(user=self.user, week=self.week, picked_team=team) for team in added
+                ])
+            if dropped or added:
+                stats.replace_survivor_teams(self.survivor_teams(), survivor_teams)
+                transaction.on_commit(lambda: invalidate_survivor_dashboard(self.week.season_id))
+        return len(changed) + len(dropped) + len(added)
@@ -0,0 +1,67 @@
+import time
+from contextlib import contextmanager, nullcontext
+from django.db import connection
+
+
+class PhaseProfiler:
+    """Wall time and ORM query count/time per named phase
+
+    Phases may nest; every phase on the stack is charged for the time and queries
+    spent inside it, so totals are inclusive of nested phases.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.stack = []
+
+    def stats(self, name):
+        return self.phases.setdefault(name, {'calls': 0, 'wall': 0.0, 'queries': 0, 'query_time': 0.0})
+
+    @contextmanager
+    def phase(self, name):
+        stats = self.stats(name)
+        stats['calls'] += 1
+        self.stack.append(stats)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats['wall'] += time.perf_counter() - start
+            self.stack.pop()
+
+    @contextmanager
+    def capture_queries(self):
+        """Count queries on the default connection for the duration of the block"""
+        with connection.execute_wrapper(self):
+            yield
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            for stats in self.stack:
+                stats['queries'] += 1
+                stats['query_time'] += elapsed
+
+    def as_dict(self):
+        return {
+            name: {**stats, 'wall': round(stats['wall'], 6), 'query_time': round(stats['query_time'], 6)}
+            for name, stats in self.phases.items()
+        }
+
+    def table(self):
+        """Format the phase breakdown as a fixed-width table"""
+        lines = [f'{"Phase":<28}{"Calls":>7}{"Wall (s)":>11}{"Queries":>10}{"Query (s)":>11}']
+        for name, stats in self.phases.items():
+            lines.append(
+                f'{name:<28}{stats["calls"]:>7}{stats["wall"]:>11.3f}'
+                f'{stats["queries"]:>10}{stats["query_time"]:>11.3f}'
+            )
+        return '\n'.join(lines)
+
+
+def maybe_phase(profiler, name):
+    """profiler.phase(name), or a no-op when profiling is off"""
+    return profiler.phase(name) if profiler else nullcontext()
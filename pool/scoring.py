@@ -0,0 +1,532 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+import django
+from django.db import connections
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Rank
+from .models import (
+    ConfidencePick, Game, LeaderboardSnapshot, LiveLeader, LiveStanding, ScoringLedger, SurvivorPick,
+    UserSeasonStats, Week, WeeklyResult,
+)
+from .survivor import invalidate_survivor_dashboard
+
+# Playoff points based on weekly rank
+PLAYOFF_POINTS = {
+    1: 20, 2: 15, 3: 14, 4: 13, 5: 12, 6: 11, 7: 10, 8: 9,
+    9: 8, 10: 7, 11: 6, 12: 5, 13: 4, 14: 3, 15: 2, 16: 1
+}
+
+
+def correct_pick_q():
+    """Q matching confidence picks whose team won a final game"""
+    return Q(game__winning_team=F('picked_team'))
+
+
+def games_needing_scoring():
+    """Games finalized or corrected since they were last scored"""
+    return Game.objects.filter(
+        Q(is_final=True, scored_at__isnull=True) | Q(updated_at__gt=F('scored_at'))
+    )
+
+
+def mark_games_scored(game_ids, scored_at):
+    """Record that the given final games were scored as of scored_at, and clear it on the others
+
+    A game that isn't final has nothing scored, so in-progress score saves (or a later
+    un-finalize) never make its week look changed.
+    """
+    # update() leaves updated_at alone, so only later edits make the game dirty again
+    Game.objects.filter(id__in=game_ids).update(
+        scored_at=Case(When(is_final=True, then=Value(scored_at)), default=None),
+    )
+
+
+def weekly_confidence_totals(week, games=None):
+    """Return {user_id: points} for the week's entrants, limited to those who picked `games` if given"""
+    picks = ConfidencePick.objects.filter(game__week=week)
+    if games is not None:
+        picks = picks.filter(
+            user__in=ConfidencePick.objects.filter(game__in=games).values('user')
+        )
+
+    rows = picks.values('user_id').annotate(
+        points=Sum(Case(
+            When(correct_pick_q(), then=F('confidence_points')),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+    ).order_by()
+
+    return {row['user_id']: row['points'] for row in rows}
+
+
+def save_pick_outcomes(games):
+    """Store is_correct and points_awarded on every confidence pick of `games` in one UPDATE"""
+    won = Exists(Game.objects.filter(id=OuterRef('game_id'), winning_team_id=OuterRef('picked_team_id')))
+    final = Exists(Game.objects.filter(id=OuterRef('game_id'), is_final=True))
+
+    return ConfidencePick.objects.filter(game__in=games).update(
+        is_correct=Case(When(won, then=Value(True)), When(final, then=Value(False)), default=None),
+        points_awarded=Case(When(won, then=F('confidence_points')), default=Value(0)),
+    )
+
+
+def save_survivor_outcomes(picks):
+    """Recompute is_correct for the given survivor picks in one UPDATE; None while the team's game is not final"""
+    won = Exists(Game.objects.filter(week=OuterRef('week_id'), winning_team_id=OuterRef('picked_team_id')))
+    lost = Exists(Game.objects.filter(
+        Q(home_team_id=OuterRef('picked_team_id')) | Q(away_team_id=OuterRef('picked_team_id')),
+        week=OuterRef('week_id'),
+        is_final=True,
+    ))
+
+    return picks.update(
+        is_correct=Case(When(won, then=Value(True)), When(lost, then=Value(False)), default=None),
+    )
+
+
+def pick_accuracy(week):
+    """Return (picks scored, correct picks) for the week's final games"""
+    counts = ConfidencePick.objects.filter(game__week=week, is_correct__isnull=False).aggregate(
+        scored=Count('id'),
+        correct=Count('id', filter=Q(is_correct=True)),
+    )
+    return counts['scored'], counts['correct']
+
+
+def ensure_season_stats(season, user_ids):
+    """Create any missing UserSeasonStats rows for the given users"""
+    # Reading the season's user ids is far cheaper than re-inserting every row and ignoring conflicts
+    existing = set(UserSeasonStats.objects.filter(season=season).values_list('user_id', flat=True))
+    UserSeasonStats.objects.bulk_create(
+        [UserSeasonStats(user_id=user_id, season=season) for user_id in user_ids if user_id not in existing],
+        ignore_conflicts=True,
+    )
+
+
+def save_weekly_results(week, points_by_user, ranks=None):
+    """Upsert WeeklyResult.confidence_points for users whose weekly total changed; returns their ids
+
+    With `ranks` from assign_ranks(), weekly_rank and playoff_points are written in the same
+    upsert, so the week needs no separate ranking pass.
+    """
+    fields = ['confidence_points'] if ranks is None else ['confidence_points', 'weekly_rank', 'playoff_points']
+    current = {
+        user_id: tuple(values)
+        for user_id, *values in WeeklyResult.objects.filter(week=week).values_list('user_id', *fields)
+    }
+
+    changed = {}
+    for user_id, points in points_by_user.items():
+        values = (points,) if ranks is None else (points, *ranks[user_id])
+        if current.get(user_id) != values:
+            changed[user_id] = values
+
+    WeeklyResult.objects.bulk_create(
+        [
+            WeeklyResult(user_id=user_id, week=week, **dict(zip(fields, values)))
+            for user_id, values in changed.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'week'],
+        update_fields=fields,
+    )
+    return set(changed)
+
+
+def split_playoff_points(rank, tied):
+    """Playoff points for each of `tied` users sharing `rank`: the points for the ranks they span, split evenly"""
+    total = sum(PLAYOFF_POINTS.get(r, 0) for r in range(rank, rank + tied))
+    return (Decimal(total) / tied).quantize(Decimal('0.01'))
+
+
+def assign_ranks(points_by_user):
+    """In-memory counterpart of rank_week: {user_id: (rank, playoff_points)} with shared ranks for ties"""
+    tied = Counter(points_by_user.values())
+
+    first_rank = {}
+    rank = 1
+    for points in sorted(tied, reverse=True):
+        first_rank[points] = rank
+        rank += tied[points]
+
+    return {
+        user_id: (first_rank[points], split_playoff_points(first_rank[points], tied[points]))
+        for user_id, points in points_by_user.items()
+    }
+
+
+def rank_week(week):
+    """Rank the week's results with a RANK() window so tied users share a rank and split its points
+
+    Returns every result in rank order, with rank and playoff points set; only rows whose values
+    changed are written back.
+    """
+    results = sorted(
+        WeeklyResult.objects.filter(week=week).annotate(
+            rank=Window(Rank(), order_by=F('confidence_points').desc()),
+            email=F('user__email'),
+        ),
+        key=lambda result: (result.rank, result.email),
+    )
+    tied = Counter(result.rank for result in results)
+
+    changed = []
+    for result in results:
+        playoff_points = split_playoff_points(result.rank, tied[result.rank])
+        if result.weekly_rank != result.rank or result.playoff_points != playoff_points:
+            result.weekly_rank = result.rank
+            result.playoff_points = playoff_points
+            changed.append(result)
+
+    WeeklyResult.objects.bulk_update(changed, ['weekly_rank', 'playoff_points'])
+    return results
+
+
+def apply_week_to_season(week):
+    """Bring season stats up to date for users whose week results differ from the ledger
+
+    Returns {user_id: (confidence_delta, playoff_delta)} for the users whose totals moved.
+    Ledger entries with no result left are backed out and deleted. Running it again without
+    new results is a no-op.
+    """
+    ledger = {entry.user_id: entry for entry in ScoringLedger.objects.filter(week=week)}
+
+    deltas = {}
+    changed_entries = []
+    for user_id, confidence_points, playoff_points in WeeklyResult.objects.filter(
+        week=week
+    ).values_list('user_id', 'confidence_points', 'playoff_points'):
+        entry = ledger.pop(user_id, None) or ScoringLedger(user_id=user_id, week=week)
+        delta = (confidence_points - entry.confidence_points, playoff_points - entry.playoff_points)
+        if not any(delta):
+            continue
+
+        deltas[user_id] = delta
+        entry.confidence_points = confidence_points
+        entry.playoff_points = playoff_points
+        changed_entries.append(entry)
+
+    # Whatever is left in the ledger lost its result, e.g. the week's last final game was un-finalized
+    for user_id, entry in ledger.items():
+        if entry.confidence_points or entry.playoff_points:
+            deltas[user_id] = (-entry.confidence_points, -entry.playoff_points)
+    if ledger:
+        ScoringLedger.objects.filter(id__in=[entry.id for entry in ledger.values()]).delete()
+
+    if not deltas:
+        return deltas
+
+    # Re-aggregate the changed users' season totals in one grouped UPDATE
+    season_results = WeeklyResult.objects.filter(
+        user=OuterRef('user'),
+        week__season=week.season,
+    ).values('user')
+    UserSeasonStats.objects.filter(season=week.season, user_id__in=list(deltas)).update(
+        total_confidence_points=Coalesce(
+            Subquery(season_results.annotate(total=Sum('confidence_points')).values('total')),
+            0,
+        ),
+        playoff_points=Coalesce(
+            Subquery(season_results.annotate(total=Sum('playoff_points')).values('total')),
+            Decimal(0),
+        ),
+    )
+    ScoringLedger.objects.bulk_create(
+        changed_entries,
+        update_conflicts=True,
+        unique_fields=['user', 'week'],
+        update_fields=['confidence_points', 'playoff_points', 'updated_at'],
+    )
+    return deltas
+
+
+def unscore_week(week):
+    """Back out a week that has no final game left: clear its pick outcomes, results and ledger entries
+
+    Returns the season deltas, as apply_week_to_season() does.
+    """
+    save_pick_outcomes(week.games.all())
+    WeeklyResult.objects.filter(week=week).delete()
+    return apply_week_to_season(week)
+
+
+def write_leaderboard_snapshots(season, from_week_number=1):
+    """Upsert cumulative standings for each scored week of the season from `from_week_number` on
+
+    Totals are accumulated from the scoring ledger, so they match season stats as of each week.
+    Ranks follow the leaderboard order, with users tied on both totals sharing a rank. Only
+    rows whose values changed are written; returns the number written.
+    """
+    contributions = defaultdict(list)
+    for week_id, user_id, confidence_points, playoff_points in ScoringLedger.objects.filter(
+        week__season=season,
+    ).values_list('week_id', 'user_id', 'confidence_points', 'playoff_points'):
+        contributions[week_id].append((user_id, confidence_points, playoff_points))
+
+    weeks = Week.objects.filter(id__in=list(contributions)).order_by('week_number').values_list('id', 'week_number')
+    existing = {
+        (snapshot.week_id, snapshot.user_id): snapshot
+        for snapshot in LeaderboardSnapshot.objects.filter(week__season=season, week__week_number__gte=from_week_number)
+    }
+
+    totals = {}
+    previous = {}
+    changed = []
+    for week_id, week_number in weeks:
+        for user_id, confidence_points, playoff_points in contributions[week_id]:
+            confidence_total, playoff_total = totals.get(user_id, (0, Decimal(0)))
+            totals[user_id] = (confidence_total + confidence_points, playoff_total + playoff_points)
+
+        standings = sorted(totals.items(), key=lambda item: (-item[1][1], -item[1][0]))
+        current = {}
+        for position, (user_id, user_totals) in enumerate(standings, 1):
+            if position == 1 or user_totals != standings[position - 2][1]:
+                rank = position
+            current[user_id] = (rank, user_totals[1])
+
+            if week_number < from_week_number:
+                continue
+
+            confidence_total, playoff_total = user_totals
+            previous_rank, previous_playoff = previous.get(user_id, (None, Decimal(0)))
+            values = {
+                'season_rank': rank,
+                'playoff_points': playoff_total,
+                'total_confidence_points': confidence_total,
+                'rank_change': previous_rank - rank if previous_rank is not None else None,
+                'playoff_points_change': playoff_total - previous_playoff,
+            }
+            snapshot = existing.pop((week_id, user_id), None)
+            if snapshot and all(getattr(snapshot, field) == value for field, value in values.items()):
+                continue
+            changed.append(LeaderboardSnapshot(user_id=user_id, week_id=week_id, **values))
+
+        previous = current
+
+    # Snapshots left over belong to weeks or users no longer in the ledger
+    if existing:
+        LeaderboardSnapshot.objects.filter(id__in=[snapshot.id for snapshot in existing.values()]).delete()
+
+    LeaderboardSnapshot.objects.bulk_create(
+        changed,
+        update_conflicts=True,
+        unique_fields=['user', 'week'],
+        update_fields=['season_rank', 'playoff_points', 'total_confidence_points', 'rank_change',
+                       'playoff_points_change', 'updated_at'],
+        batch_size=1000,
+    )
+    return len(changed)
+
+
+def final_games_by_team(week):
+    """Map team id -> (game id, winning team id or None) for the week's final games"""
+    games_by_team = {}
+    for game_id, home_team_id, away_team_id, winning_team_id in week.games.filter(
+        is_final=True
+    ).values_list('id', 'home_team_id', 'away_team_id', 'winning_team_id'):
+        games_by_team[home_team_id] = games_by_team[away_team_id] = (game_id, winning_team_id)
+    return games_by_team
+
+
+def resolve_survivor_picks(week, game_ids=None):
+    """Work out the week's survivor picks against its final games without writing anything
+
+    With `game_ids`, only picks of teams playing in those games are looked at, so a corrected or
+    un-finalized game rescores the picks it decides. Returns (changed_picks, unmatched_picks):
+    picks whose outcome differs from the stored one, and picks whose team has no final game yet
+    (their outcome is None). Picks carry `email` and `team` annotations for reporting.
+    """
+    games_by_team = final_games_by_team(week)
+
+    picks = SurvivorPick.objects.filter(week=week)
+    if game_ids is not None:
+        games = Game.objects.filter(id__in=game_ids)
+        picks = picks.filter(
+            Q(picked_team__in=games.values('home_team')) | Q(picked_team__in=games.values('away_team'))
+        )
+    picks = picks.annotate(
+        email=F('user__email'),
+        team=F('picked_team__abbreviation'),
+    ).order_by('user__email', 'id')
+
+    changed_picks = []
+    unmatched_picks = []
+    for pick in picks:
+        team_game = games_by_team.get(pick.picked_team_id)
+        if team_game is None:
+            unmatched_picks.append(pick)
+            is_correct = None
+        else:
+            is_correct = team_game[1] == pick.picked_team_id
+
+        if pick.is_correct != is_correct:
+            pick.is_correct = is_correct
+            changed_picks.append(pick)
+
+    return changed_picks, unmatched_picks
+
+
+def save_survivor_picks(week, changed_picks):
+    """Save re-resolved survivor picks and recount their users' strikes; returns the ids of users who took a strike
+
+    Strikes and elimination are recounted from the season's losing picks rather than incremented,
+    so a corrected or un-finalized game takes its strike back.
+    """
+    if not changed_picks:
+        return set()
+
+    SurvivorPick.objects.bulk_update(changed_picks, ['is_correct'])
+    recount_survivor_strikes(week, {pick.user_id for pick in changed_picks})
+    return {pick.user_id for pick in changed_picks if pick.is_correct is False}
+
+
+def recount_survivor_strikes(week, user_ids):
+    """Recount strikes and elimination for `user_ids` from their losing picks in the week's season"""
+    invalidate_survivor_dashboard(week.season_id)
+    ensure_season_stats(week.season, user_ids)
+
+    losses = SurvivorPick.objects.filter(
+        user=OuterRef('user'),
+        week__season=week.season,
+        is_correct=False,
+    ).order_by().values('user').annotate(count=Count('id')).values('count')
+    season_stats = UserSeasonStats.objects.filter(season=week.season, user_id__in=user_ids)
+    season_stats.update(survivor_strikes=Coalesce(Subquery(losses), 0))
+    season_stats.update(is_eliminated_survivor=Case(
+        When(survivor_strikes__gte=3, then=Value(True)),
+        default=Value(False),
+    ))
+
+
+def score_survivor_week(week, game_ids=None):
+    """Rescore the week's survivor picks (only those decided by `game_ids`, if given) and recount strikes
+
+    Returns (changed_picks, unmatched_picks, struck_user_ids).
+    """
+    changed_picks, unmatched_picks = resolve_survivor_picks(week, game_ids)
+    return changed_picks, unmatched_picks, save_survivor_picks(week, changed_picks)
+
+
+def leading_team_id(home_team_id, away_team_id, home_score, away_score):
+    """The team currently ahead, or None when level"""
+    if home_score > away_score:
+        return home_team_id
+    elif away_score > home_score:
+        return away_team_id
+    return None
+
+
+def update_live_standings(week):
+    """Refresh projected totals and ranks for the week from games that have scores
+
+    Only games whose leader changed since the last update matter, and only users who picked
+    the old or new leader of such a game are re-totalled. Returns the ids of those users.
+    """
+    flips = {}
+    for game_id, home_team_id, away_team_id, home_score, away_score, previous_leader_id in week.games.values_list(
+        'id', 'home_team_id', 'away_team_id', 'home_score', 'away_score', 'live_leader__team_id'
+    ):
+        # A game whose score was cleared has no leader, so its old leader's pickers lose the points
+        leader_id = None
+        if home_score is not None and away_score is not None:
+            leader_id = leading_team_id(home_team_id, away_team_id, home_score, away_score)
+        if leader_id != previous_leader_id:
+            flips[game_id] = (previous_leader_id, leader_id)
+
+    initial = not LiveStanding.objects.filter(week=week).exists()
+    if not flips and not initial:
+        return set()
+
+    LiveLeader.objects.bulk_create(
+        [LiveLeader(game_id=game_id, team_id=leader_id) for game_id, (_, leader_id) in flips.items()],
+        update_conflicts=True,
+        unique_fields=['game'],
+        update_fields=['team'],
+    )
+
+    picks = ConfidencePick.objects.filter(game__week=week)
+    if not initial:
+        flipped_picks = Q()
+        for game_id, team_ids in flips.items():
+            flipped_picks |= Q(game_id=game_id, picked_team_id__in=[t for t in team_ids if t is not None])
+        picks = picks.filter(user__in=ConfidencePick.objects.filter(flipped_picks).values('user'))
+
+    totals = picks.values('user_id').annotate(
+        points=Sum(Case(
+            When(game__live_leader__team=F('picked_team'), then=F('confidence_points')),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+    ).order_by()
+
+    standings = [
+        LiveStanding(user_id=row['user_id'], week=week, projected_points=row['points'])
+        for row in totals
+    ]
+    LiveStanding.objects.bulk_create(
+        standings,
+        update_conflicts=True,
+        unique_fields=['user', 'week'],
+        update_fields=['projected_points', 'updated_at'],
+    )
+
+    changed = []
+    for standing in LiveStanding.objects.filter(week=week).annotate(
+        rank=Window(Rank(), order_by=F('projected_points').desc()),
+    ):
+        if standing.projected_rank != standing.rank:
+            standing.projected_rank = standing.rank
+            changed.append(standing)
+    LiveStanding.objects.bulk_update(changed, ['projected_rank'])
+
+    return {standing.user_id for standing in standings}
+
+
+def init_worker():
+    """Process pool initializer: make sure Django is set up and no parent connection is reused"""
+    django.setup()
+    connections.close_all()
+
+
+def compute_week(week_id):
+    """Read-only scoring for one week, safe to run in a worker process
+
+    Returns plain data for write_week(): confidence totals, ranks and resolved survivor picks.
+    """
+    week = Week.objects.get(id=week_id)
+    # A week without final games gets no results; write_week() backs out any it had
+    final = week.games.filter(is_final=True).exists()
+    points_by_user = weekly_confidence_totals(week) if final else {}
+    scored_picks, unmatched_picks = resolve_survivor_picks(week)
+
+    return {
+        'week_id': week_id,
+        'final': final,
+        'points': points_by_user,
+        'ranks': assign_ranks(points_by_user),
+        'survivor_picks': scored_picks,
+        'unmatched_picks': unmatched_picks,
+    }
+
+
+def write_week(week, computed):
+    """Write the output of compute_week() for `week`; returns (season deltas, struck user ids)
+
+    Every write is set-based: pick outcomes and survivor picks are each one UPDATE, and results
+    go in one upsert with their ranks, so the single writer does little more than the workers.
+    """
+    if computed['final']:
+        save_pick_outcomes(week.games.all())
+        ensure_season_stats(week.season, computed['points'])
+        save_weekly_results(week, computed['points'], computed['ranks'])
+        deltas = apply_week_to_season(week)
+    else:
+        deltas = unscore_week(week)
+
+    changed_picks = computed['survivor_picks']
+    if not changed_picks:
+        return deltas, set()
+    save_survivor_outcomes(SurvivorPick.objects.filter(week=week))
+    recount_survivor_strikes(week, {pick.user_id for pick in changed_picks})
+    return deltas, {pick.user_id for pick in changed_picks if pick.is_correct is False}
@@ -0,0 +1,154 @@
+import hashlib
+import numpy as np
+from django.core.cache import cache
+from .pick_matrix import PickMatrix
+from .scoring import PLAYOFF_POINTS
+
+# Enumerate every outcome up to this many undecided games, sample beyond it
+EXHAUSTIVE_MAX_GAMES = 20
+DEFAULT_SAMPLES = 100_000
+# Scenarios scored per matrix multiplication; bounds memory at BATCH_SIZE x users
+BATCH_SIZE = 500
+# Users expected to score most, whose scores bound each scenario's paying cut from below
+PROBE_USERS = 1024
+NUM_SLOTS = len(PLAYOFF_POINTS)
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def results_fingerprint(week):
+    """Short hash of the week's final results; changes whenever a result does"""
+    results = list(week.games.order_by('id').values_list('id', 'is_final', 'winning_team_id'))
+    return hashlib.md5(repr(results).encode()).hexdigest()[:16]
+
+
+def cache_key(week, samples):
+    return f'week-simulation:{week.id}:{samples}:{results_fingerprint(week)}'
+
+
+def get_cached_simulation(week, samples=DEFAULT_SAMPLES):
+    """The cached simulation for the week's current results, or None"""
+    return cache.get(cache_key(week, samples))
+
+
+def cached_simulation(week, samples=DEFAULT_SAMPLES, seed=None):
+    """Simulate the week unless a simulation for its current results is already cached"""
+    key = cache_key(week, samples)
+    simulation = cache.get(key)
+    if simulation is None:
+        simulation = simulate_week(week, samples=samples, seed=seed)
+        cache.set(key, simulation, CACHE_TIMEOUT)
+    return simulation
+
+
+def remaining_scenarios(num_games, samples, rng):
+    """Yield batches of home-win indicator rows (1 = home wins) and the weight of each scenario"""
+    if num_games <= EXHAUSTIVE_MAX_GAMES:
+        total = 2 ** num_games
+        bits = np.arange(num_games, dtype=np.int64)
+        for start in range(0, total, BATCH_SIZE):
+            codes = np.arange(start, min(start + BATCH_SIZE, total), dtype=np.int64)
+            yield ((codes[:, np.newaxis] >> bits) & 1).astype(np.float32), 1.0 / total
+    else:
+        for start in range(0, samples, BATCH_SIZE):
+            size = min(BATCH_SIZE, samples - start)
+            yield rng.integers(0, 2, size=(size, num_games)).astype(np.float32), 1.0 / samples
+
+
+def simulate_week(week, samples=DEFAULT_SAMPLES, seed=None, matrix=None):
+    """Probability of each user finishing in each PLAYOFF_POINTS slot once the week's undecided games are played
+
+    Final games keep their result; every other game is a coin flip, enumerated exhaustively
+    for up to EXHAUSTIVE_MAX_GAMES games and sampled `samples` times beyond that. Tied users
+    share a rank, as in weekly scoring. Returns a plain dict suitable for caching.
+    """
+    matrix = matrix or PickMatrix.for_week(week)
+    winners = dict(week.games.filter(is_final=True).values_list('id', 'winning_team_id'))
+    final = np.isin(matrix.game_ids, list(winners))
+
+    known = matrix.outcome_vector(winners)
+    remaining = np.flatnonzero(~final)
+
+    # points = base + home_wins @ swing.T, where base assumes every remaining game goes to the away side
+    base = matrix.score(known).astype(np.float32) + matrix.away_weights[:, remaining].sum(axis=1)
+    swing = matrix.home_weights[:, remaining] - matrix.away_weights[:, remaining]
+
+    num_users = matrix.num_users
+    max_points = int(base.max() + np.clip(swing, 0, None).sum(axis=1).max()) + 1 if num_users else 1
+
+    # Cumulative playoff points, used to split the points for tied ranks
+    cumulative = np.zeros(num_users + 2)
+    for rank, points in PLAYOFF_POINTS.items():
+        if rank <= num_users:
+            cumulative[rank:] += points
+
+    # slot_probabilities[u, s] is P(rank == s + 1); the last column is "outside the paying slots"
+    slot_probabilities = np.zeros((num_users, NUM_SLOTS + 1))
+    expected_playoff_points = np.zeros(num_users)
+    scenarios = 0
+
+    # The paying cut in each scenario is at least the NUM_SLOTS-th best score among the users
+    # expected to score most, so only users at or above that bound need ranking
+    probes = np.argsort(-(base + swing.sum(axis=1) / 2))[:PROBE_USERS]
+    probe_swing = np.ascontiguousarray(swing[probes].T)
+    cut_slot = min(NUM_SLOTS, len(probes))
+
+    rng = np.random.default_rng(seed)
+    for home_wins, weight in remaining_scenarios(len(remaining), samples, rng):
+        points = home_wins @ swing.T
+        points += base
+        scenarios += len(points)
+
+        if cut_slot:
+            probe_points = home_wins @ probe_swing + base[probes]
+            cut = np.partition(probe_points, -cut_slot, axis=1)[:, -cut_slot]
+        else:
+            cut = np.zeros(len(points), dtype=np.float32)
+        candidates = np.flatnonzero(points >= cut[:, np.newaxis])
+        scenario_index, user_index = np.divmod(candidates, num_users)
+        scores = points.ravel()[candidates].astype(np.int64)
+
+        # Sort candidates by scenario, best score first; every user scoring at least the cut
+        # is a candidate, so a candidate's rank among candidates is its rank in the scenario
+        order = np.argsort(scenario_index * max_points + (max_points - 1 - scores), kind='stable')
+        scenario_index, user_index, scores = scenario_index[order], user_index[order], scores[order]
+        position = np.arange(len(order))
+        new_scenario = np.ones(len(order), dtype=bool)
+        new_scenario[1:] = scenario_index[1:] != scenario_index[:-1]
+        new_score = new_scenario.copy()
+        new_score[1:] |= scores[1:] != scores[:-1]
+        scenario_start = np.maximum.accumulate(np.where(new_scenario, position, 0))
+        score_start = np.maximum.accumulate(np.where(new_score, position, 0))
+        score_group = np.cumsum(new_score) - 1
+
+        ranks = score_start - scenario_start + 1
+        tied = np.bincount(score_group)[score_group]
+        paid = ranks <= NUM_SLOTS
+        ranks, tied, user_index = ranks[paid], tied[paid], user_index[paid]
+
+        slot_probabilities[:, :NUM_SLOTS] += weight * np.bincount(
+            user_index * NUM_SLOTS + ranks - 1, minlength=num_users * NUM_SLOTS
+        ).reshape(num_users, NUM_SLOTS)
+
+        last_rank = np.minimum(ranks + tied - 1, num_users)
+        split = (cumulative[last_rank] - cumulative[ranks - 1]) / tied
+        expected_playoff_points += weight * np.bincount(user_index, weights=split, minlength=num_users)
+
+    # Whatever probability isn't in a paying slot is outside them
+    slot_probabilities[:, NUM_SLOTS] = 1 - slot_probabilities[:, :NUM_SLOTS].sum(axis=1)
+
+    return {
+        'week_id': week.id,
+        'scenarios': scenarios,
+        'exhaustive': len(remaining) <= EXHAUSTIVE_MAX_GAMES,
+        'remaining_games': len(remaining),
+        'users': {
+            user_id: {
+                'slots': slot_probabilities[index, :NUM_SLOTS].round(6).tolist(),
+                'outside': round(float(slot_probabilities[index, NUM_SLOTS]), 6),
+                'paid': round(float(1 - slot_probabilities[index, NUM_SLOTS]), 6),
+                'win': round(float(slot_probabilities[index, 0]), 6),
+                'expected_playoff_points': round(float(expected_playoff_points[index]), 3),
+            }
+            for index, user_id in enumerate(matrix.user_ids.tolist())
+        },
+    }
@@ -0,0 +1,112 @@
+from collections import Counter
+from django.core.cache import cache
+from django.db.models import Count
+from .models import SURVIVOR_MASK_BITS, SurvivorPick, Team, UserSeasonStats
+
+STRIKES_TO_ELIMINATE = 3
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+ENTRANTS_PAGE_SIZE = 50
+
+
+def dashboard_cache_key(season_id):
+    return f'survivor-dashboard:{season_id}'
+
+
+def invalidate_survivor_dashboard(season_id):
+    cache.delete(dashboard_cache_key(season_id))
+
+
+def refresh_survivor_teams(user_seasons):
+    """Rebuild survivor_teams_used from the stored picks for each (user id, season id) pair
+
+    For edits made outside WeekContext.save_picks, such as in the admin, where the old and
+    new picks are not known up front.
+    """
+    for user_id, season_id in set(user_seasons):
+        mask = 0
+        for bit in SurvivorPick.objects.filter(
+            user_id=user_id, week__season_id=season_id, picked_team__survivor_bit__isnull=False,
+        ).values_list('picked_team__survivor_bit', flat=True):
+            mask |= 1 << bit
+        UserSeasonStats.objects.update_or_create(
+            user_id=user_id, season_id=season_id, defaults={'survivor_teams_used': mask},
+        )
+        invalidate_survivor_dashboard(season_id)
+
+
+def survivor_dashboard(season, week=None):
+    """Alive/strike counts, per-user remaining teams and per-team picks for `week`, cached per season
+
+    The cache is cleared whenever survivor picks are scored or saved, so every entrant
+    refreshing the page shares one computation between scoring runs.
+    """
+    key = dashboard_cache_key(season.id)
+    dashboard = cache.get(key)
+    if dashboard is None or dashboard['week_id'] != (week.id if week else None):
+        dashboard = build_survivor_dashboard(season, week)
+        cache.set(key, dashboard, CACHE_TIMEOUT)
+    return dashboard
+
+
+def build_survivor_dashboard(season, week=None):
+    """One pass over the season's stats rows, plus one grouped count of the week's survivor picks"""
+    entrants = []
+    strike_counts = Counter()
+    for user_id, email, strikes, eliminated, used in UserSeasonStats.objects.filter(
+        season=season,
+    ).values_list('user_id', 'user__email', 'survivor_strikes', 'is_eliminated_survivor', 'survivor_teams_used'):
+        strike_counts[strikes] += 1
+        entrants.append({
+            'user_id': user_id,
+            'email': email,
+            'strikes': strikes,
+            'eliminated': eliminated,
+            'teams_used': used,
+            'teams_remaining': SURVIVOR_MASK_BITS - used.bit_count(),
+        })
+    entrants.sort(key=lambda entrant: (entrant['eliminated'], entrant['strikes'], entrant['email']))
+
+    teams = {
+        team_id: {'id': team_id, 'abbreviation': abbreviation, 'name': f'{city} {name}', 'bit': bit, 'picks': 0}
+        for team_id, abbreviation, city, name, bit in Team.objects.values_list(
+            'id', 'abbreviation', 'city', 'name', 'survivor_bit'
+        )
+    }
+    if week:
+        for team_id, picks in SurvivorPick.objects.filter(week=week).order_by().values(
+            'picked_team_id'
+        ).annotate(picks=Count('id')).values_list('picked_team_id', 'picks'):
+            teams[team_id]['picks'] = picks
+
+    alive = sum(1 for entrant in entrants if not entrant['eliminated'])
+    return {
+        'season_id': season.id,
+        'week_id': week.id if week else None,
+        'entrants': len(entrants),
+        'alive': alive,
+        'eliminated': len(entrants) - alive,
+        'strike_counts': [strike_counts[strikes] for strikes in range(STRIKES_TO_ELIMINATE + 1)],
+        'users': entrants,
+        'teams': sorted(teams.values(), key=lambda team: (-team['picks'], team['name'])),
+    }
+
+
+def remaining_teams(dashboard, teams_used):
+    """Teams from the dashboard whose survivor bit is not set in `teams_used`"""
+    return sorted(
+        (team for team in dashboard['teams'] if not teams_used & (1 << team['bit'])),
+        key=lambda team: team['name'],
+    )
+
+
+def entrants_page(dashboard, page=1, size=ENTRANTS_PAGE_SIZE):
+    """One page of the dashboard's sorted entrants; out-of-range pages clamp to the first or last"""
+    entrants = dashboard['users']
+    pages = max((len(entrants) + size - 1) // size, 1)
+    page = min(max(page, 1), pages)
+    return {
+        'rows': entrants[(page - 1) * size:page * size],
+        'number': page,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if page < pages else None,
+    }
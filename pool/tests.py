@@ -1,3 +1,1394 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Q, Sum
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .forms import SurvivorPickForm, WeekPicksForm, games_fingerprint, pick_field_prototypes
+from .leaderboard import (
+    AROUND_ME_NEIGHBORS, LEADERBOARD_ORDER, LIVE_ORDER, LIVE_REVERSE_ORDER, PAGE_SIZE, REVERSE_ORDER, after_q, before_q,
+    live_after_q, live_before_q,
+)
+from .models import (
+    ConfidencePick, Game, LeaderboardSnapshot, LiveLeader, LiveStanding, ScoringLedger, Season, SurvivorPick, Team,
+    UserSeasonStats, Week, WeeklyResult, survivor_mask,
+)
+from .pick_matrix import AWAY, HOME, NO_RESULT, PickMatrix
+from .picks import WeekContext
+from .scoring import (
+    PLAYOFF_POINTS, assign_ranks, games_needing_scoring, leading_team_id, update_live_standings,
+    weekly_confidence_totals,
+)
+from .simulation import cache_key as simulation_cache_key, simulate_week
+from .survivor import ENTRANTS_PAGE_SIZE, STRIKES_TO_ELIMINATE, build_survivor_dashboard, survivor_dashboard
 
-# Create your tests here.
+# "SCAN pool_game" (or "SCAN TABLE pool_game" on older SQLite) with no index is a full table scan
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+( AS \w+)?\s*$')
+# Keep tests away from the file cache in BASE_DIR/cache
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryPlanTests(TestCase):
+    """The hot queries in views, forms and score_games must be answered from an index"""
+
+    def assertUsesIndexes(self, queryset, ordered=False):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are written against SQLite EXPLAIN QUERY PLAN output')
+
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            self.assertIsNone(FULL_SCAN.search(line), f'Full table scan:\n{plan}')
+        if ordered:
+            self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan, f'Sorted outside the index:\n{plan}')
+        return plan
+
+    def test_week_confidence_picks(self):
+        self.assertUsesIndexes(ConfidencePick.objects.filter(user_id=1, game__week_id=1))
+
+    def test_week_survivor_picks(self):
+        plan = self.assertUsesIndexes(SurvivorPick.objects.filter(user_id=1, week_id=1))
+        self.assertIn('survivor_user_week_idx', plan)
+
+    def test_season_survivor_picks(self):
+        self.assertUsesIndexes(SurvivorPick.objects.filter(user_id=1, week__season_id=1))
+
+    def test_active_week(self):
+        for week in [Week.objects.filter(is_active=True)[:1], Week.objects.filter(season_id=1, is_active=True)[:1]]:
+            self.assertIn('week_active_idx', self.assertUsesIndexes(week))
+
+    def test_weekly_results_by_points(self):
+        plan = self.assertUsesIndexes(
+            WeeklyResult.objects.filter(week_id=1).order_by('-confidence_points'),
+            ordered=True,
+        )
+        self.assertIn('result_week_points_idx', plan)
+
+    def test_leaderboard_pages(self):
+        standings = UserSeasonStats.objects.filter(season_id=1)
+        key = (Decimal('12.50'), 300, 7)
+        for page in [
+            standings.order_by(*LEADERBOARD_ORDER)[:50],
+            standings.filter(after_q(key)).order_by(*LEADERBOARD_ORDER)[:50],
+            standings.filter(before_q(key)).order_by(*REVERSE_ORDER)[:50],
+        ]:
+            plan = self.assertUsesIndexes(page, ordered=True)
+            self.assertIn('stats_leaderboard_idx', plan)
+
+    def test_live_standings_pages(self):
+        standings = LiveStanding.objects.filter(week_id=1, projected_rank__isnull=False)
+        key = (12, 7)
+        for page in [
+            standings.order_by(*LIVE_ORDER)[:50],
+            standings.filter(live_after_q(key)).order_by(*LIVE_ORDER)[:50],
+            standings.filter(live_before_q(key)).order_by(*LIVE_REVERSE_ORDER)[:50],
+        ]:
+            plan = self.assertUsesIndexes(page, ordered=True)
+            self.assertIn('live_rank_idx', plan)
+
+    def test_incremental_confidence_totals(self):
+        picks = ConfidencePick.objects.filter(game__week_id=1).filter(
+            user__in=ConfidencePick.objects.filter(game__in=[1, 2]).values('user')
+        )
+        plan = self.assertUsesIndexes(picks)
+        self.assertIn('pick_game_user_idx', plan)
+
+
+def build_pool(year, num_users, num_games, final=False, seed=0):
+    """An active season and week with `num_games` games (the Bears always play) and a full pick sheet per user"""
+    rng = random.Random(seed)
+    Season.objects.update(is_active=False)
+    Week.objects.update(is_active=False)
+    season = Season.objects.create(year=year)
+    week = Week.objects.create(
+        season=season,
+        week_number=2,
+        is_active=True,
+        picks_deadline=timezone.now() + timedelta(days=1),
+    )
+
+    bears = Team.objects.get(abbreviation='CHI')
+    teams = [bears] + rng.sample(list(Team.objects.exclude(id=bears.id)), 2 * num_games - 1)
+    games = []
+    for i in range(num_games):
+        home_score, away_score = (rng.randint(0, 40), rng.randint(0, 40)) if final else (None, None)
+        games.append(Game.objects.create(
+            week=week,
+            home_team=teams[2 * i],
+            away_team=teams[2 * i + 1],
+            game_time=timezone.now() + timedelta(days=1, hours=i),
+            game_day=Game.SUNDAY,
+            home_score=home_score,
+            away_score=away_score,
+            is_final=final,
+        ))
+
+    users = []
+    for n in range(num_users):
+        user = User.objects.create(username=f'{year}-{n}', email=f'{year}-{n}@example.com')
+        users.append(user)
+        UserSeasonStats.objects.create(user=user, season=season)
+        confidence = rng.sample(range(1, num_games + 1), num_games)
+        ConfidencePick.objects.bulk_create([
+            ConfidencePick(
+                user=user,
+                game=game,
+                picked_team=rng.choice([game.home_team, game.away_team]),
+                confidence_points=points,
+            )
+            for game, points in zip(games, confidence)
+        ])
+        SurvivorPick.objects.bulk_create([
+            SurvivorPick(user=user, week=week, picked_team=team)
+            for team in rng.sample(teams, week.survivor_picks_required())
+        ])
+    return season, week, games, users
+
+
+def picks_post_data(user, week, games):
+    """A valid make_picks submission: Bears and home teams, confidence in schedule order, same survivor teams"""
+    data = {}
+    for points, game in enumerate(games, 1):
+        bears_game = 'CHI' in (game.home_team.abbreviation, game.away_team.abbreviation)
+        picked = game.home_team if not bears_game or game.home_team.abbreviation == 'CHI' else game.away_team
+        data[f'game_{game.id}_team'] = picked.id
+        data[f'game_{game.id}_confidence'] = points
+    survivor_picks = SurvivorPick.objects.filter(user=user, week=week).order_by('id')
+    for i, pick in enumerate(survivor_picks, 1):
+        data[f'survivor_pick_{i}'] = pick.picked_team_id
+    return data
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTests(TestCase):
+    """Views and score_games run a fixed number of queries, however many users or games there are"""
+
+    HOME_QUERIES = 7
+    MAKE_PICKS_GET_QUERIES = 8
+    MAKE_PICKS_POST_QUERIES = 11
+    LEADERBOARD_QUERIES = 8
+    SCORE_GAMES_QUERIES = 29
+    RESCORE_WEEK_QUERIES = 18
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+
+    def sizes(self):
+        """(users, games) for a small and a large pool"""
+        return [(3, 6), (25, 16)]
+
+    def login(self, user):
+        self.client.force_login(user)
+
+    def test_home(self):
+        for year, (num_users, num_games) in enumerate(self.sizes(), 2001):
+            _, _, _, users = build_pool(year, num_users, num_games)
+            self.login(users[0])
+            with self.subTest(users=num_users, games=num_games), self.assertNumQueries(self.HOME_QUERIES):
+                self.assertEqual(self.client.get(reverse('pool:home')).status_code, 200)
+
+    def test_make_picks_get(self):
+        for year, (num_users, num_games) in enumerate(self.sizes(), 2001):
+            _, week, _, users = build_pool(year, num_users, num_games)
+            self.login(users[0])
+            with self.subTest(users=num_users, games=num_games), self.assertNumQueries(self.MAKE_PICKS_GET_QUERIES):
+                response = self.client.get(reverse('pool:make_picks', args=[week.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['existing_picks']), num_games)
+            self.assertEqual(
+                len(response.context['survivor_form'].existing_picks), week.survivor_picks_required()
+            )
+
+    def test_make_picks_post(self):
+        for year, (num_users, num_games) in enumerate(self.sizes(), 2001):
+            _, week, games, users = build_pool(year, num_users, num_games)
+            self.login(users[0])
+            data = picks_post_data(users[0], week, games)
+            with self.subTest(users=num_users, games=num_games), self.assertNumQueries(self.MAKE_PICKS_POST_QUERIES):
+                response = self.client.post(reverse('pool:make_picks', args=[week.id]), data)
+            self.assertRedirects(response, reverse('pool:home'), fetch_redirect_response=False)
+            self.assertEqual(ConfidencePick.objects.filter(user=users[0], game__week=week).count(), num_games)
+
+    def test_leaderboard(self):
+        for year, (num_users, num_games) in enumerate(self.sizes(), 2001):
+            season, _, _, users = build_pool(year, num_users, num_games)
+            self.login(users[0])
+            with self.subTest(users=num_users, games=num_games), self.assertNumQueries(self.LEADERBOARD_QUERIES):
+                response = self.client.get(reverse('pool:leaderboard_season', args=[season.id]))
+            self.assertEqual(len(response.context['standings']), num_users)
+
+    def test_score_games(self):
+        for year, (num_users, num_games) in enumerate(self.sizes(), 2001):
+            _, week, _, _ = build_pool(year, num_users, num_games, final=True, seed=year)
+            with self.subTest(users=num_users, games=num_games):
+                with self.assertNumQueries(self.SCORE_GAMES_QUERIES):
+                    call_command('score_games', stdout=StringIO())
+                with self.assertNumQueries(self.RESCORE_WEEK_QUERIES):
+                    call_command('score_games', '--week-id', week.id, stdout=StringIO())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SurvivorPageTests(TestCase):
+    """The survivor page renders one page of entrants, plus the user's own row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        cls.season, _, _, users = build_pool(2001, ENTRANTS_PAGE_SIZE * 2 + 10, 2)
+        # Entrants with no strikes are listed by email, so this one is on the last page
+        cls.user = max(users, key=lambda user: user.email)
+        cls.url = reverse('pool:survivor_season', args=[cls.season.id])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def emails(self, response):
+        return [entrant['email'] for entrant in response.context['entrants']]
+
+    def test_first_page_leads_with_own_row(self):
+        response = self.client.get(self.url)
+        emails = self.emails(response)
+        self.assertEqual(len(emails), ENTRANTS_PAGE_SIZE + 1)
+        self.assertEqual(emails[0], self.user.email)
+        self.assertEqual(emails.count(self.user.email), 1)
+        self.assertIsNone(response.context['previous_page'])
+        self.assertEqual(response.context['next_page'], 2)
+        self.assertEqual(response.context['dashboard']['entrants'], ENTRANTS_PAGE_SIZE * 2 + 10)
+
+    def test_around_me_shows_own_page(self):
+        response = self.client.get(self.url, {'around': 'me'})
+        emails = self.emails(response)
+        self.assertEqual(len(emails), 10)
+        self.assertEqual(emails[-1], self.user.email)
+        self.assertEqual(response.context['previous_page'], 2)
+        self.assertIsNone(response.context['next_page'])
+
+    def test_out_of_range_pages_clamp(self):
+        self.assertEqual(self.client.get(self.url, {'page': 99}).context['previous_page'], 2)
+        self.assertEqual(self.client.get(self.url, {'page': 'x'}).context['next_page'], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeaderboardPageTests(TestCase):
+    """The leaderboard renders one keyset page, or a window around the user, with tied totals sharing a rank"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        cls.season, _, _, users = build_pool(2001, PAGE_SIZE * 2 + 10, 2)
+        # Users tie in threes, so the tie on positions 49 to 51 straddles the first page break
+        for i, user in enumerate(users):
+            UserSeasonStats.objects.filter(user=user).update(
+                playoff_points=Decimal(100 - i // 6), total_confidence_points=500 - i // 3,
+            )
+        stats = sorted(UserSeasonStats.objects.filter(season=cls.season), key=lambda row: (
+            -row.playoff_points, -row.total_confidence_points, -row.id,
+        ))
+        totals = [(row.playoff_points, row.total_confidence_points) for row in stats]
+        cls.expected = [
+            (row.user_id, 1 + sum(other > key for other in totals)) for row, key in zip(stats, totals)
+        ]
+        cls.url = reverse('pool:leaderboard_season', args=[cls.season.id])
+        cls.user = users[0]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def ranked_rows(self, response):
+        return [(stats.user_id, stats.rank) for stats in response.context['standings']]
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context['previous_cursor'])
+        while True:
+            page = self.ranked_rows(response)
+            self.assertLessEqual(len(page), PAGE_SIZE)
+            seen += page
+            if not response.context['next_cursor']:
+                break
+            response = self.client.get(self.url, {'after': response.context['next_cursor']})
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(seen[PAGE_SIZE][1], seen[PAGE_SIZE - 1][1])
+
+        # Going back from the last page gives the page before it
+        previous = self.client.get(self.url, {'before': response.context['previous_cursor']})
+        self.assertEqual(self.ranked_rows(previous), seen[PAGE_SIZE:PAGE_SIZE * 2])
+
+    def test_around_me(self):
+        position = PAGE_SIZE + 5
+        me = User.objects.get(id=self.expected[position][0])
+        self.client.force_login(me)
+        response = self.client.get(self.url, {'around': 'me'})
+        self.assertTrue(response.context['around_me'])
+        self.assertEqual(
+            self.ranked_rows(response),
+            self.expected[position - AROUND_ME_NEIGHBORS:position + AROUND_ME_NEIGHBORS + 1],
+        )
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get(self.url, {'after': '1_x_2'})
+        self.assertEqual(self.ranked_rows(response), self.expected[:PAGE_SIZE])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LiveStandingsPageTests(TestCase):
+    """The live standings page renders one keyset page, or a window around the user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        _, cls.week, _, users = build_pool(2001, PAGE_SIZE * 2 + 10, 2)
+        # Pairs of users tie on every rank
+        LiveStanding.objects.bulk_create([
+            LiveStanding(user=user, week=cls.week, projected_points=200 - i // 2, projected_rank=i // 2 * 2 + 1)
+            for i, user in enumerate(users)
+        ])
+        cls.users = users
+        cls.url = reverse('pool:live_standings_week', args=[cls.week.id])
+
+    def setUp(self):
+        self.client.force_login(self.users[0])
+
+    def user_ids(self, response):
+        return [standing.user_id for standing in response.context['standings']]
+
+    def test_pages_cover_every_standing_once(self):
+        seen = []
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context['previous_cursor'])
+        while True:
+            page = self.user_ids(response)
+            self.assertLessEqual(len(page), PAGE_SIZE)
+            seen += page
+            if not response.context['next_cursor']:
+                break
+            response = self.client.get(self.url, {'after': response.context['next_cursor']})
+        self.assertEqual(seen, [user.id for user in self.users])
+
+        # Going back from the last page gives the page before it
+        previous = self.client.get(self.url, {'before': response.context['previous_cursor']})
+        self.assertEqual(self.user_ids(previous), seen[PAGE_SIZE:PAGE_SIZE * 2])
+
+    def test_around_me(self):
+        me = self.users[PAGE_SIZE + 5]
+        self.client.force_login(me)
+        response = self.client.get(self.url, {'around': 'me'})
+        ids = self.user_ids(response)
+        self.assertEqual(len(ids), AROUND_ME_NEIGHBORS * 2 + 1)
+        self.assertEqual(ids[AROUND_ME_NEIGHBORS], me.id)
+        self.assertEqual(ids, [user.id for user in self.users[PAGE_SIZE + 5 - AROUND_ME_NEIGHBORS:][:len(ids)]])
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get(self.url, {'after': 'nope'})
+        self.assertEqual(self.user_ids(response), [user.id for user in self.users[:PAGE_SIZE]])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UpdateLiveStandingsTests(TestCase):
+    """Incremental live updates agree with totalling every pick against the current leaders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        _, cls.week, cls.games, _ = build_pool(2001, 60, 8)
+
+    def recomputed(self):
+        leaders = {
+            game.id: leading_team_id(game.home_team_id, game.away_team_id, game.home_score, game.away_score)
+            for game in Game.objects.filter(week=self.week, home_score__isnull=False)
+        }
+        points = Counter()
+        for user_id, game_id, team_id, confidence in ConfidencePick.objects.filter(game__week=self.week).values_list(
+            'user_id', 'game_id', 'picked_team_id', 'confidence_points'
+        ):
+            points[user_id] += confidence if leaders.get(game_id) == team_id else 0
+        return {
+            user_id: (total, 1 + sum(1 for other in points.values() if other > total))
+            for user_id, total in points.items()
+        }
+
+    def stored(self):
+        return {
+            user_id: (points, rank)
+            for user_id, points, rank in LiveStanding.objects.filter(week=self.week).values_list(
+                'user_id', 'projected_points', 'projected_rank'
+            )
+        }
+
+    def test_incremental_updates_match_full_recompute(self):
+        rng = random.Random(7)
+        for _ in range(12):
+            # Any game may start, flip its leader, draw level or stay put
+            stale = Game.objects.get(id=rng.choice(self.games).id)
+            for game in rng.sample(self.games, 3):
+                game.home_score, game.away_score = rng.randint(0, 21), rng.randint(0, 21)
+                game.save()
+            update_live_standings(self.week)
+            self.assertEqual(self.stored(), self.recomputed())
+
+            # A Game instance loaded before the update is saved after it, as a score feed might
+            stale.save()
+        self.assertTrue(LiveLeader.objects.filter(game__week=self.week).exists())
+
+
+def saved_sheet_data(user, week):
+    """POST data that resubmits the user's stored picks for the week unchanged"""
+    data = {}
+    for pick in ConfidencePick.objects.filter(user=user, game__week=week):
+        data[f'game_{pick.game_id}_team'] = pick.picked_team_id
+        data[f'game_{pick.game_id}_confidence'] = pick.confidence_points
+    survivor_picks = SurvivorPick.objects.filter(user=user, week=week).order_by('id')
+    for i, pick in enumerate(survivor_picks, 1):
+        data[f'survivor_pick_{i}'] = pick.picked_team_id
+    return data
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PickMatrixTests(TestCase):
+    """PickMatrix scores a week's picks the same way weekly scoring does"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        _, cls.week, games, _ = build_pool(2001, 30, 6, final=True, seed=5)
+        # One tie and one undecided game, neither of which pays anyone
+        games[0].home_score = games[0].away_score = 17
+        games[0].save()
+        games[1].is_final = False
+        games[1].save()
+
+    def test_score_matches_weekly_confidence_totals(self):
+        matrix = PickMatrix.for_week(self.week)
+        winners = dict(self.week.games.filter(is_final=True).values_list('id', 'winning_team_id'))
+        outcomes = matrix.outcome_vector(winners)
+        self.assertEqual(
+            dict(zip(matrix.user_ids.tolist(), matrix.score(outcomes).tolist())),
+            weekly_confidence_totals(self.week),
+        )
+
+    def test_score_many_scores_each_scenario(self):
+        matrix = PickMatrix.for_week(self.week)
+        scenarios = np.array(list(itertools.product([HOME, AWAY, NO_RESULT], repeat=matrix.num_games)))[::37]
+        points = matrix.score_many(scenarios)
+        for outcomes, scenario_points in zip(scenarios, points):
+            self.assertEqual(scenario_points.tolist(), matrix.score(outcomes).tolist())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SimulateWeekTests(TestCase):
+    """simulate_week matches ranking every outcome of the undecided games with assign_ranks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        # More users than paying slots, and few enough games that weekly totals tie often
+        _, cls.week, cls.games, _ = build_pool(2001, 24, 7, seed=3)
+        for game, (home_score, away_score) in zip(cls.games, [(24, 10), (7, 21), (13, 13)]):
+            game.home_score, game.away_score, game.is_final = home_score, away_score, True
+            game.save()
+
+    def enumerated(self):
+        """Slot probabilities and expected playoff points from ranking every outcome exhaustively"""
+        games = list(Game.objects.filter(week=self.week))
+        decided = {game.id: game.winning_team_id for game in games if game.is_final}
+        undecided = [game for game in games if not game.is_final]
+        picks = list(ConfidencePick.objects.filter(game__week=self.week).values_list(
+            'user_id', 'game_id', 'picked_team_id', 'confidence_points'
+        ))
+        user_ids = {user_id for user_id, *_ in picks}
+
+        slots = {user_id: [0.0] * len(PLAYOFF_POINTS) for user_id in user_ids}
+        expected = dict.fromkeys(user_ids, 0.0)
+        outcomes = list(itertools.product(*[(game.home_team_id, game.away_team_id) for game in undecided]))
+        for outcome in outcomes:
+            winners = {**decided, **{game.id: team_id for game, team_id in zip(undecided, outcome)}}
+            points = dict.fromkeys(user_ids, 0)
+            for user_id, game_id, team_id, confidence in picks:
+                if winners[game_id] == team_id:
+                    points[user_id] += confidence
+            for user_id, (rank, playoff_points) in assign_ranks(points).items():
+                if rank <= len(PLAYOFF_POINTS):
+                    slots[user_id][rank - 1] += 1 / len(outcomes)
+                expected[user_id] += float(playoff_points) / len(outcomes)
+        return slots, expected
+
+    def assertMatchesEnumeration(self, simulation):
+        slots, expected = self.enumerated()
+        self.assertTrue(simulation['exhaustive'])
+        self.assertEqual(simulation['scenarios'], 2 ** 4)
+        self.assertEqual(set(simulation['users']), set(slots))
+        for user_id, outlook in simulation['users'].items():
+            with self.subTest(user=user_id):
+                for probability, enumerated in zip(outlook['slots'], slots[user_id]):
+                    self.assertAlmostEqual(probability, enumerated, places=5)
+                self.assertAlmostEqual(outlook['outside'], 1 - sum(slots[user_id]), places=5)
+                # assign_ranks rounds each split to the cent
+                self.assertAlmostEqual(outlook['expected_playoff_points'], expected[user_id], delta=0.01)
+
+    def test_matches_enumeration(self):
+        self.assertMatchesEnumeration(simulate_week(self.week))
+
+    def test_matches_enumeration_with_small_batches_and_few_probes(self):
+        # A probe set barely larger than the paying slots only bounds each scenario's cut loosely
+        with mock.patch('pool.simulation.BATCH_SIZE', 5), mock.patch('pool.simulation.PROBE_USERS', 17):
+            self.assertMatchesEnumeration(simulate_week(self.week))
+
+    def test_cache_key_follows_results(self):
+        key = simulation_cache_key(self.week, 1000)
+        game = Game.objects.get(id=self.games[3].id)
+
+        # An in-progress score is not a result
+        game.home_score, game.away_score = 3, 0
+        game.save()
+        self.assertEqual(simulation_cache_key(self.week, 1000), key)
+
+        game.is_final = True
+        game.save()
+        final_key = simulation_cache_key(self.week, 1000)
+        self.assertNotEqual(final_key, key)
+
+        game.away_score = 7
+        game.save()
+        self.assertNotIn(simulation_cache_key(self.week, 1000), {key, final_key})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GameWinningTeamTests(TestCase):
+    """winning_team follows the score and is_final on every save"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        _, _, (cls.game,), _ = build_pool(2001, 0, 1)
+
+    def assertWinner(self, team):
+        self.assertEqual(Game.objects.get(pk=self.game.pk).winning_team, team)
+
+    def test_results(self):
+        game = self.game
+        for home_score, away_score, is_final, winner in [
+            (None, None, False, None),
+            (24, 17, False, None),
+            (24, 17, True, game.home_team),
+            (17, 24, True, game.away_team),
+            (20, 20, True, None),
+        ]:
+            with self.subTest(home_score=home_score, away_score=away_score, is_final=is_final):
+                game.home_score, game.away_score, game.is_final = home_score, away_score, is_final
+                game.save()
+                self.assertWinner(winner)
+                self.assertEqual(
+                    Game.objects.filter(pk=game.pk, winning_team__isnull=False).exists(), winner is not None
+                )
+
+    def test_update_fields(self):
+        game = self.game
+        game.home_score, game.away_score, game.is_final = 24, 17, True
+        game.save(update_fields=['home_score', 'away_score', 'is_final'])
+        self.assertWinner(game.home_team)
+
+        game.is_final = False
+        game.save(update_fields=['is_final'])
+        self.assertWinner(None)
+
+        # Swapping the teams of a final game moves the win to the other team
+        game.is_final = True
+        game.save(update_fields=['is_final'])
+        game.home_team, game.away_team = game.away_team, game.home_team
+        game.save(update_fields=['home_team', 'away_team'])
+        self.assertWinner(game.home_team)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SavePicksTests(TestCase):
+    """make_picks writes only the picks that changed, atomically"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        bears = Team.objects.get(abbreviation='CHI')
+        cls.season, cls.week, cls.games, users = build_pool(2001, 2, 6)
+        cls.user = users[0]
+        # Bears picks are required, and build_pool picks randomly
+        ConfidencePick.objects.filter(game__in=cls.games, game__home_team=bears).update(picked_team=bears)
+        UserSeasonStats.objects.filter(user=cls.user).update(survivor_teams_used=survivor_mask(
+            pick.picked_team for pick in SurvivorPick.objects.filter(user=cls.user).select_related('picked_team')
+        ))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('pool:make_picks', args=[self.week.id])
+
+    def stored_picks(self):
+        """Game id to (pick id, picked team id, confidence points, created_at, updated_at)"""
+        return {
+            pick.game_id: (pick.id, pick.picked_team_id, pick.confidence_points, pick.created_at, pick.updated_at)
+            for pick in ConfidencePick.objects.filter(user=self.user, game__week=self.week)
+        }
+
+    def test_unchanged_sheet_writes_nothing(self):
+        before = self.stored_picks()
+        survivor_before = list(SurvivorPick.objects.filter(user=self.user).values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, saved_sheet_data(self.user, self.week))
+        self.assertRedirects(response, reverse('pool:home'), fetch_redirect_response=False)
+
+        writes = [q['sql'] for q in queries if q['sql'].split(None, 1)[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertEqual(self.stored_picks(), before)
+        self.assertEqual(
+            list(SurvivorPick.objects.filter(user=self.user).values_list('id', flat=True)), survivor_before
+        )
+
+    def test_only_changed_picks_are_written(self):
+        data = saved_sheet_data(self.user, self.week)
+        # Swap the confidence of two games
+        first, second = [f'game_{game.id}_confidence' for game in self.games[:2]]
+        data[first], data[second] = data[second], data[first]
+        # and replace one survivor team with an unused one
+        stats = UserSeasonStats.objects.get(user=self.user, season=self.season)
+        replacement = next(team for team in Team.objects.all() if not stats.has_used_survivor_team(team))
+        dropped = data['survivor_pick_1']
+        data['survivor_pick_1'] = replacement.id
+
+        before = self.stored_picks()
+        response = self.client.post(self.url, data)
+        self.assertRedirects(response, reverse('pool:home'), fetch_redirect_response=False)
+
+        after = self.stored_picks()
+        for game in self.games:
+            if game in self.games[:2]:
+                pick_id, team_id, points, created_at, updated_at = after[game.id]
+                old_id, old_team_id, _, old_created_at, old_updated_at = before[game.id]
+                self.assertEqual((pick_id, team_id, created_at), (old_id, old_team_id, old_created_at))
+                self.assertEqual(points, data[f'game_{game.id}_confidence'])
+                self.assertGreater(updated_at, old_updated_at)
+            else:
+                self.assertEqual(after[game.id], before[game.id])
+
+        stats.refresh_from_db()
+        self.assertTrue(stats.has_used_survivor_team(replacement))
+        self.assertFalse(stats.has_used_survivor_team(Team.objects.get(id=dropped)))
+
+    def test_failed_save_keeps_previous_sheet(self):
+        data = picks_post_data(self.user, self.week, self.games)
+        data['survivor_pick_1'] = next(
+            team.id for team in Team.objects.all()
+            if not UserSeasonStats.objects.get(user=self.user).has_used_survivor_team(team)
+        )
+        before = self.stored_picks()
+        survivor_before = list(SurvivorPick.objects.filter(user=self.user).values_list('picked_team_id', flat=True))
+
+        with mock.patch.object(SurvivorPick.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.client.post(self.url, data)
+
+        self.assertEqual(self.stored_picks(), before)
+        self.assertEqual(
+            list(SurvivorPick.objects.filter(user=self.user).values_list('picked_team_id', flat=True)), survivor_before
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SurvivorPickFormTests(TestCase):
+    """Teams used in earlier weeks are neither offered nor accepted; this week's own picks stay available"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        cls.season, cls.week, _, (cls.user,) = build_pool(2001, 1, 2)
+        cls.current = [pick.picked_team for pick in SurvivorPick.objects.filter(user=cls.user)]
+        cls.used, cls.unused = Team.objects.exclude(id__in=[team.id for team in cls.current])[:2]
+        earlier = Week.objects.create(season=cls.season, week_number=1, picks_deadline=timezone.now())
+        SurvivorPick.objects.create(user=cls.user, week=earlier, picked_team=cls.used)
+        UserSeasonStats.objects.filter(user=cls.user).update(
+            survivor_teams_used=survivor_mask([cls.used, *cls.current])
+        )
+
+    def form(self, data=None):
+        return SurvivorPickForm(data, week=self.week, user=self.user)
+
+    def test_used_teams_are_not_offered(self):
+        offered = {team_id for team_id, _ in self.form().fields['survivor_pick_1'].choices if team_id}
+        self.assertNotIn(self.used.id, offered)
+        self.assertTrue({team.id for team in [self.unused, *self.current]} <= offered)
+
+    def test_used_team_is_rejected(self):
+        kept, _ = self.current
+        self.assertTrue(self.form({'survivor_pick_1': kept.id, 'survivor_pick_2': self.unused.id}).is_valid())
+        self.assertFalse(self.form({'survivor_pick_1': kept.id, 'survivor_pick_2': self.used.id}).is_valid())
+
+    def test_no_pick_scan(self):
+        stats = UserSeasonStats.objects.get(user=self.user)
+        week_context = WeekContext(self.week, self.user)
+        with self.assertNumQueries(0):
+            form = SurvivorPickForm(
+                {'survivor_pick_1': self.unused.id, 'survivor_pick_2': self.used.id},
+                week=self.week, user=self.user, stats=stats, week_context=week_context,
+            )
+            self.assertFalse(form.is_valid())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SurvivorPickAdminTests(TestCase):
+    """Survivor picks added, changed or deleted in the admin keep the used-teams mask in sync"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        cls.season, cls.week, _, (cls.user,) = build_pool(2001, 1, 2)
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.teams = list(Team.objects.exclude(
+            id__in=SurvivorPick.objects.filter(user=cls.user).values('picked_team')
+        )[:2])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def used_mask(self):
+        return UserSeasonStats.objects.get(user=self.user, season=self.season).survivor_teams_used
+
+    def expected_mask(self):
+        return survivor_mask(Team.objects.filter(
+            id__in=SurvivorPick.objects.filter(user=self.user).values('picked_team')
+        ))
+
+    def pick_data(self, team):
+        return {'user': self.user.id, 'week': self.week.id, 'picked_team': team.id, 'is_correct': 'unknown'}
+
+    def test_add_change_and_delete(self):
+        added, replacement = self.teams
+        self.client.post(reverse('admin:pool_survivorpick_add'), self.pick_data(added))
+        pick = SurvivorPick.objects.get(user=self.user, picked_team=added)
+        self.assertTrue(self.used_mask() & added.survivor_mask)
+        self.assertEqual(self.used_mask(), self.expected_mask())
+
+        self.client.post(reverse('admin:pool_survivorpick_change', args=[pick.id]), self.pick_data(replacement))
+        self.assertFalse(self.used_mask() & added.survivor_mask)
+        self.assertTrue(self.used_mask() & replacement.survivor_mask)
+        self.assertEqual(self.used_mask(), self.expected_mask())
+
+        self.client.post(reverse('admin:pool_survivorpick_delete', args=[pick.id]), {'post': 'yes'})
+        self.assertFalse(self.used_mask() & replacement.survivor_mask)
+        self.assertEqual(self.used_mask(), self.expected_mask())
+
+        # The changelist's "delete selected" action clears every remaining pick
+        self.client.post(reverse('admin:pool_survivorpick_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': list(SurvivorPick.objects.filter(user=self.user).values_list('id', flat=True)),
+            'post': 'yes',
+        })
+        self.assertFalse(SurvivorPick.objects.filter(user=self.user).exists())
+        self.assertEqual(self.used_mask(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class WeekPicksFormTests(TestCase):
+    """Pick fields are built once per week and copied into each form"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        cls.season, cls.week, cls.games, cls.users = build_pool(2001, 2, 6)
+
+    def setUp(self):
+        pick_field_prototypes.cache_clear()
+
+    def test_fields_are_built_once_per_week(self):
+        first, second = [WeekPicksForm(week=self.week, user=user) for user in self.users]
+        info = pick_field_prototypes.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 1))
+
+        field = f'game_{self.games[0].id}_confidence'
+        self.assertIsNot(first.fields[field], second.fields[field])
+        picks = {
+            user.id: ConfidencePick.objects.get(user=user, game=self.games[0]).confidence_points for user in self.users
+        }
+        self.assertEqual(first.fields[field].initial, picks[self.users[0].id])
+        self.assertEqual(second.fields[field].initial, picks[self.users[1].id])
+        # Per-form initial values never reach the shared prototype
+        self.assertIsNone(pick_field_prototypes(self.week.id, games_fingerprint(first.games))[field].initial)
+
+    def test_fields_are_rebuilt_when_games_change(self):
+        game = self.games[0]
+        WeekPicksForm(week=self.week, user=self.users[0])
+        replacement = Team.objects.exclude(
+            id__in=[team_id for g in self.games for team_id in (g.home_team_id, g.away_team_id)]
+        ).first()
+        Game.objects.filter(id=game.id).update(away_team=replacement)
+
+        form = WeekPicksForm(week=self.week, user=self.users[0])
+        self.assertEqual(pick_field_prototypes.cache_info().misses, 2)
+        team_field = form.fields[f'game_{game.id}_team']
+        self.assertEqual(team_field.label, f'{replacement.abbreviation} @ {game.home_team.abbreviation}')
+        self.assertIn(replacement.id, dict(team_field.choices))
+
+
+class InlineExecutor:
+    """Stands in for ProcessPoolExecutor so --workers runs compute_week in the test process"""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TiedRanksTests(TestCase):
+    """Tied users share a rank and split the playoff points of the ranks they span"""
+
+    # Weekly totals, and the (rank, playoff points) each total earns
+    TOTALS = [
+        (100, 1, '20.00'),
+        (90, 2, '14.50'), (90, 2, '14.50'),  # ranks 2-3: (15 + 14) / 2
+        (80, 4, '12.00'), (80, 4, '12.00'), (80, 4, '12.00'),  # ranks 4-6: (13 + 12 + 11) / 3
+        (79, 7, '10.00'), (78, 8, '9.00'), (77, 9, '8.00'), (76, 10, '7.00'), (75, 11, '6.00'),
+        (74, 12, '5.00'), (73, 13, '4.00'), (72, 14, '3.00'), (71, 15, '2.00'),
+        (60, 16, '0.50'), (60, 16, '0.50'),  # ranks 16-17: (1 + 0) / 2
+        (50, 18, '0.00'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        cls.season = Season.objects.create(year=2001)
+        home, away = Team.objects.order_by('id')[:2]
+        cls.users = [
+            User.objects.create(username=f'tied-{n}', email=f'tied-{n:02d}@example.com') for n in range(len(cls.TOTALS))
+        ]
+        # Two identical weeks of one final game each; every user picks the winner for their total
+        for week_number in (1, 2):
+            week = Week.objects.create(season=cls.season, week_number=week_number, picks_deadline=timezone.now())
+            game = Game.objects.create(
+                week=week, home_team=home, away_team=away, game_time=timezone.now(), game_day=Game.SUNDAY,
+                home_score=21, away_score=14, is_final=True,
+            )
+            ConfidencePick.objects.bulk_create([
+                ConfidencePick(user=user, game=game, picked_team=home, confidence_points=points)
+                for user, (points, _, _) in zip(cls.users, cls.TOTALS)
+            ])
+
+    def expected(self):
+        return {
+            user.id: (rank, Decimal(playoff_points))
+            for user, (_, rank, playoff_points) in zip(self.users, self.TOTALS)
+        }
+
+    def assertScored(self):
+        for week in self.season.weeks.all():
+            self.assertEqual({
+                user_id: (rank, playoff_points)
+                for user_id, rank, playoff_points in WeeklyResult.objects.filter(week=week).values_list(
+                    'user_id', 'weekly_rank', 'playoff_points'
+                )
+            }, self.expected())
+        self.assertEqual(
+            dict(UserSeasonStats.objects.filter(season=self.season).values_list('user_id', 'playoff_points')),
+            {user_id: 2 * playoff_points for user_id, (_, playoff_points) in self.expected().items()},
+        )
+
+    def test_assign_ranks(self):
+        points = {user.id: total for user, (total, _, _) in zip(self.users, self.TOTALS)}
+        self.assertEqual(assign_ranks(points), self.expected())
+
+    def test_score_games(self):
+        # rank_week
+        call_command('score_games', '--all', stdout=StringIO())
+        self.assertScored()
+
+    def test_rebuild_season(self):
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertScored()
+
+    def test_workers(self):
+        with mock.patch('pool.management.commands.score_games.ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.object(connections, 'close_all'):
+            call_command('score_games', '--all', '--workers', 2, stdout=StringIO())
+        self.assertScored()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SeasonScoringTests(TestCase):
+    """Incremental runs, score_games --all and rebuild_season agree on a partly played season"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        # Three of six weeks played, so the unplayed weeks hold picks but no results
+        call_command(
+            'generate_synthetic_pool', '--users', 40, '--season', 2001, '--weeks', 6, '--final-weeks', 3,
+            stdout=StringIO(),
+        )
+        cls.season = Season.objects.get(year=2001)
+
+    def season_state(self):
+        return {
+            'stats': set(UserSeasonStats.objects.filter(season=self.season).values_list(
+                'user_id', 'total_confidence_points', 'playoff_points', 'survivor_strikes', 'is_eliminated_survivor',
+                'survivor_teams_used',
+            )),
+            'results': set(WeeklyResult.objects.filter(week__season=self.season).values_list(
+                'user_id', 'week_id', 'confidence_points', 'weekly_rank', 'playoff_points',
+            )),
+            'ledger': set(ScoringLedger.objects.filter(week__season=self.season).values_list(
+                'user_id', 'week_id', 'confidence_points', 'playoff_points',
+            )),
+            'snapshots': set(LeaderboardSnapshot.objects.filter(week__season=self.season).values_list(
+                'user_id', 'week_id', 'season_rank', 'playoff_points', 'total_confidence_points', 'rank_change',
+            )),
+        }
+
+    def test_weekly_totals_match_picks(self):
+        call_command('score_games', '--all', stdout=StringIO())
+
+        # Total every pick of every final game one at a time
+        expected = Counter()
+        for pick in ConfidencePick.objects.filter(game__week__season=self.season, game__is_final=True).select_related(
+            'game'
+        ):
+            game = pick.game
+            won = (game.home_score > game.away_score and pick.picked_team_id == game.home_team_id) or (
+                game.away_score > game.home_score and pick.picked_team_id == game.away_team_id
+            )
+            expected[pick.user_id, game.week_id] += pick.confidence_points if won else 0
+
+        results = WeeklyResult.objects.filter(week__season=self.season)
+        self.assertEqual(
+            {(user_id, week_id): points for user_id, week_id, points in results.values_list(
+                'user_id', 'week_id', 'confidence_points',
+            )},
+            dict(expected),
+        )
+        totals = Counter()
+        for (user_id, _), points in expected.items():
+            totals[user_id] += points
+        self.assertEqual(
+            dict(UserSeasonStats.objects.filter(season=self.season).values_list('user_id', 'total_confidence_points')),
+            dict(totals),
+        )
+
+    def test_pick_outcomes_sum_to_weekly_results(self):
+        call_command('score_games', '--all', stdout=StringIO())
+
+        picks = ConfidencePick.objects.filter(game__week__season=self.season).select_related('game')
+        for pick in picks:
+            game = pick.game
+            expected = (pick.picked_team_id == game.winning_team_id) if game.is_final else None
+            self.assertEqual(pick.is_correct, expected, pick)
+            self.assertEqual(pick.points_awarded, pick.confidence_points if expected else 0, pick)
+
+        self.assertEqual(
+            {
+                (row['user_id'], row['game__week_id']): row['points']
+                for row in picks.filter(game__is_final=True).values('user_id', 'game__week_id').annotate(
+                    points=Sum('points_awarded')
+                )
+            },
+            {
+                (user_id, week_id): points
+                for user_id, week_id, points in WeeklyResult.objects.filter(week__season=self.season).values_list(
+                    'user_id', 'week_id', 'confidence_points',
+                )
+            },
+        )
+
+    def test_rescoring_is_idempotent(self):
+        call_command('score_games', '--all', stdout=StringIO())
+        scored = self.season_state()
+        # The ledger holds exactly what each week contributed to season stats
+        self.assertEqual(scored['ledger'], {
+            (user_id, week_id, confidence_points, playoff_points)
+            for user_id, week_id, confidence_points, _, playoff_points in scored['results']
+        })
+
+        out = StringIO()
+        call_command('score_games', '--all', '--json', stdout=out)
+        self.assertEqual([week['season_totals_changed'] for week in json.loads(out.getvalue())['weeks']], [0, 0, 0])
+        self.assertEqual(self.season_state(), scored)
+
+    def test_survivor_picks_and_strikes(self):
+        call_command('score_games', '--all', stdout=StringIO())
+
+        games = list(Game.objects.filter(week__season=self.season))
+        losses = Counter()
+        for pick in SurvivorPick.objects.filter(week__season=self.season):
+            played = [
+                game for game in games
+                if game.week_id == pick.week_id and pick.picked_team_id in (game.home_team_id, game.away_team_id)
+            ]
+            final = [game for game in played if game.is_final]
+            expected = (final[0].winning_team_id == pick.picked_team_id) if final else None
+            self.assertEqual(pick.is_correct, expected, pick)
+            losses[pick.user_id] += expected is False
+
+        for stats in UserSeasonStats.objects.filter(season=self.season):
+            self.assertEqual(stats.survivor_strikes, losses[stats.user_id])
+            self.assertEqual(stats.is_eliminated_survivor, losses[stats.user_id] >= STRIKES_TO_ELIMINATE)
+        self.assertTrue(any(losses.values()))
+
+    def test_leaderboard_snapshots_follow_cumulative_totals(self):
+        call_command('score_games', '--all', stdout=StringIO())
+
+        totals = Counter()
+        playoff = Counter()
+        previous_ranks = {}
+        for week in self.season.weeks.filter(games__is_final=True).distinct().order_by('week_number'):
+            for user_id, confidence_points, playoff_points in WeeklyResult.objects.filter(week=week).values_list(
+                'user_id', 'confidence_points', 'playoff_points'
+            ):
+                totals[user_id] += confidence_points
+                playoff[user_id] += playoff_points
+            # Rank one past everyone strictly ahead on (playoff points, confidence points)
+            keys = {user_id: (playoff[user_id], totals[user_id]) for user_id in totals}
+            ranks = {user_id: 1 + sum(other > key for other in keys.values()) for user_id, key in keys.items()}
+
+            self.assertEqual(
+                {
+                    snapshot.user_id: (
+                        snapshot.season_rank, snapshot.playoff_points, snapshot.total_confidence_points,
+                        snapshot.rank_change,
+                    )
+                    for snapshot in LeaderboardSnapshot.objects.filter(week=week)
+                },
+                {
+                    user_id: (
+                        rank, playoff[user_id], totals[user_id],
+                        previous_ranks[user_id] - rank if user_id in previous_ranks else None,
+                    )
+                    for user_id, rank in ranks.items()
+                },
+            )
+            previous_ranks = ranks
+
+        # Some ranks moved, so rank_change is exercised beyond zeros
+        self.assertTrue(LeaderboardSnapshot.objects.filter(week__season=self.season, rank_change__gt=0).exists())
+        self.assertEqual(
+            set(UserSeasonStats.objects.filter(season=self.season).values_list(
+                'user_id', 'playoff_points', 'total_confidence_points',
+            )),
+            {(user_id, playoff[user_id], totals[user_id]) for user_id in totals},
+        )
+
+    def test_survivor_dashboard_matches_picks(self):
+        cache.clear()
+        call_command('score_games', '--all', stdout=StringIO())
+        week = self.season.weeks.get(week_number=3)
+        dashboard = survivor_dashboard(self.season, week)
+
+        stats = list(UserSeasonStats.objects.filter(season=self.season))
+        self.assertEqual(dashboard['entrants'], len(stats))
+        self.assertEqual(dashboard['alive'], sum(1 for row in stats if not row.is_eliminated_survivor))
+        self.assertEqual(dashboard['eliminated'], sum(1 for row in stats if row.is_eliminated_survivor))
+        strikes = Counter(row.survivor_strikes for row in stats)
+        self.assertEqual(dashboard['strike_counts'], [strikes[n] for n in range(STRIKES_TO_ELIMINATE + 1)])
+
+        used = {row.user_id: set() for row in stats}
+        for user_id, team_id in SurvivorPick.objects.filter(week__season=self.season).values_list(
+            'user_id', 'picked_team_id'
+        ):
+            used[user_id].add(team_id)
+        self.assertEqual(
+            {entrant['user_id']: entrant['teams_remaining'] for entrant in dashboard['users']},
+            {user_id: Team.objects.count() - len(teams) for user_id, teams in used.items()},
+        )
+        self.assertEqual(
+            {team['id']: team['picks'] for team in dashboard['teams'] if team['picks']},
+            dict(Counter(SurvivorPick.objects.filter(week=week).values_list('picked_team_id', flat=True))),
+        )
+
+    def test_survivor_dashboard_is_refreshed_by_scoring(self):
+        cache.clear()
+        call_command('score_games', '--all', stdout=StringIO())
+        week = self.season.weeks.get(week_number=3)
+        before = survivor_dashboard(self.season, week)
+        with self.assertNumQueries(0):
+            self.assertEqual(survivor_dashboard(self.season, week), before)
+
+        # Reversing a result picked in survivor moves strikes between that game's pickers
+        game = week.games.exclude(winning_team=None).filter(
+            Q(home_team__in=week.survivor_picks.values('picked_team')) |
+            Q(away_team__in=week.survivor_picks.values('picked_team'))
+        ).first()
+        game.home_score, game.away_score = game.away_score, game.home_score
+        game.save()
+        call_command('score_games', stdout=StringIO())
+
+        after = survivor_dashboard(self.season, week)
+        self.assertNotEqual(after['users'], before['users'])
+        self.assertEqual(after, build_survivor_dashboard(self.season, week))
+
+    def test_matches_score_games_on_partly_played_season(self):
+        call_command('score_games', '--all', stdout=StringIO())
+        scored = self.season_state()
+        self.assertEqual({week_id for _, week_id, *_ in scored['results']}, set(
+            self.season.weeks.filter(week_number__lte=3).values_list('id', flat=True)
+        ))
+
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertEqual(self.season_state(), scored)
+
+    def test_rebuild_season_chunk_size(self):
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        rebuilt = self.season_state()
+        # Chunks far smaller than a week's picks or the season's users must not change the result
+        call_command('rebuild_season', '--season', 2001, '--chunk-size', 7, stdout=StringIO())
+        self.assertEqual(self.season_state(), rebuilt)
+
+    def test_workers_match_rebuild_season(self):
+        # Run compute_week in this process, against the test database
+        with mock.patch('pool.management.commands.score_games.ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.object(connections, 'close_all'):
+            call_command('score_games', '--all', '--workers', 2, stdout=StringIO())
+            scored = self.season_state()
+            call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+            self.assertEqual(self.season_state(), scored)
+
+            # Flip a survivor result and un-finalize a week, then rescore through the workers again
+            pick = SurvivorPick.objects.filter(week__season=self.season, is_correct=True).select_related('week').first()
+            game = pick.week.games.get(Q(home_team=pick.picked_team_id) | Q(away_team=pick.picked_team_id))
+            game.home_score, game.away_score = (10, 24) if game.home_team_id == pick.picked_team_id else (24, 10)
+            game.save()
+            unfinalized = self.season.weeks.get(week_number=3)
+            unfinalized.games.update(is_final=False)
+            call_command('score_games', '--all', '--workers', 2, stdout=StringIO())
+            call_command('score_games', '--week-id', unfinalized.id, '--workers', 2, stdout=StringIO())
+
+        pick.refresh_from_db()
+        self.assertFalse(pick.is_correct)
+        self.assertFalse(WeeklyResult.objects.filter(week=unfinalized).exists())
+        incremental = self.season_state()
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertEqual(incremental, self.season_state())
+
+    def test_corrected_score_rescores_survivor_picks(self):
+        call_command('score_games', '--all', stdout=StringIO())
+        pick = SurvivorPick.objects.filter(
+            week__season=self.season, is_correct=False,
+        ).exclude(user__season_stats__is_eliminated_survivor=True).select_related('week').first()
+        game = pick.week.games.get(Q(home_team=pick.picked_team_id) | Q(away_team=pick.picked_team_id))
+        strikes = UserSeasonStats.objects.get(user=pick.user_id, season=self.season).survivor_strikes
+
+        # A corrected final score turns the survivor loss into a win
+        if game.home_team_id == pick.picked_team_id:
+            game.home_score, game.away_score = 24, 10
+        else:
+            game.home_score, game.away_score = 10, 24
+        game.save()
+        call_command('score_games', stdout=StringIO())
+
+        pick.refresh_from_db()
+        self.assertTrue(pick.is_correct)
+        stats = UserSeasonStats.objects.get(user=pick.user_id, season=self.season)
+        self.assertEqual(stats.survivor_strikes, strikes - 1)
+
+        incremental = self.season_state()
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertEqual(incremental, self.season_state())
+
+    def test_corrected_score_saved_with_update_fields_is_rescored(self):
+        call_command('score_games', '--all', stdout=StringIO())
+        game = Game.objects.filter(week__season=self.season, is_final=True).exclude(winning_team=None).first()
+        game.home_score, game.away_score = game.away_score, game.home_score
+        game.save(update_fields=['home_score', 'away_score'])
+
+        self.assertEqual(list(games_needing_scoring().values_list('id', flat=True)), [game.id])
+        call_command('score_games', stdout=StringIO())
+
+        self.assertFalse(games_needing_scoring().exists())
+        game.refresh_from_db()
+        self.assertEqual(
+            set(ConfidencePick.objects.filter(game=game, is_correct=True).values_list('picked_team_id', flat=True)),
+            {game.winning_team_id},
+        )
+        incremental = self.season_state()
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertEqual(incremental, self.season_state())
+
+    def test_in_progress_score_on_unplayed_week_is_not_scored(self):
+        unplayed = self.season.weeks.get(week_number=6)
+        call_command('score_games', '--week-id', unplayed.id, stdout=StringIO())
+        call_command('score_games', '--all', stdout=StringIO())
+        scored = self.season_state()
+
+        game = unplayed.games.first()
+        game.home_score, game.away_score = 7, 3
+        game.save()
+        call_command('score_games', stdout=StringIO())
+
+        self.assertFalse(WeeklyResult.objects.filter(week=unplayed).exists())
+        self.assertEqual(self.season_state(), scored)
+
+    def test_unfinalized_week_is_backed_out(self):
+        call_command('score_games', '--all', stdout=StringIO())
+        week = self.season.weeks.get(week_number=3)
+        for game in week.games.all():
+            game.is_final = False
+            game.save()
+        call_command('score_games', stdout=StringIO())
+
+        self.assertFalse(WeeklyResult.objects.filter(week=week).exists())
+        self.assertFalse(ScoringLedger.objects.filter(week=week).exists())
+        self.assertFalse(ConfidencePick.objects.filter(game__week=week, is_correct__isnull=False).exists())
+        incremental = self.season_state()
+
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertEqual(incremental, self.season_state())
+
+    def test_failed_week_is_rolled_back(self):
+        call_command('score_games', '--all', stdout=StringIO())
+        pick = SurvivorPick.objects.filter(week__season=self.season, is_correct=True).select_related('week').first()
+        game = pick.week.games.get(Q(home_team=pick.picked_team_id) | Q(away_team=pick.picked_team_id))
+        game.home_score, game.away_score = (10, 24) if game.home_team_id == pick.picked_team_id else (24, 10)
+        game.save()
+        before = self.season_state()
+
+        # Fail after the survivor picks are saved but before strikes are recounted
+        with mock.patch('pool.scoring.invalidate_survivor_dashboard', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            call_command('score_games', stdout=StringIO())
+        pick.refresh_from_db()
+        self.assertTrue(pick.is_correct)
+        self.assertEqual(self.season_state(), before)
+
+        # The game is still unscored, so the next run applies the loss and its strike
+        call_command('score_games', stdout=StringIO())
+        pick.refresh_from_db()
+        self.assertFalse(pick.is_correct)
+        incremental = self.season_state()
+        call_command('rebuild_season', '--season', 2001, stdout=StringIO())
+        self.assertEqual(incremental, self.season_state())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ScoreGamesOutputTests(TestCase):
+    """score_games --json has a fixed schema, and --workers reports exactly what a serial run does"""
+
+    WEEK_KEYS = {
+        'week_id', 'week', 'users_scored', 'season_totals_changed', 'picks_scored', 'correct_picks',
+        'correct_pick_rate', 'top', 'survivor_picks_scored', 'survivor_strikes', 'eliminated',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_teams', stdout=StringIO())
+        call_command(
+            'generate_synthetic_pool', '--users', 30, '--season', 2001, '--weeks', 4, '--final-weeks', 3,
+            stdout=StringIO(),
+        )
+        cls.season = Season.objects.get(year=2001)
+
+    def score_games(self, *args):
+        out = StringIO()
+        with mock.patch('pool.management.commands.score_games.ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.object(connections, 'close_all'):
+            call_command('score_games', *args, stdout=out)
+        return out.getvalue()
+
+    def test_json_summary(self):
+        output = json.loads(self.score_games('--all', '--json'))
+        self.assertEqual(set(output), {'weeks'})
+        weeks = {week.id: week for week in self.season.weeks.filter(week_number__lte=3)}
+        self.assertEqual([summary['week_id'] for summary in output['weeks']], sorted(weeks))
+
+        for summary in output['weeks']:
+            with self.subTest(week=summary['week']):
+                week = weeks[summary['week_id']]
+                self.assertEqual(set(summary), self.WEEK_KEYS)
+                self.assertEqual(summary['week'], str(week))
+                self.assertEqual(summary['users_scored'], WeeklyResult.objects.filter(week=week).count())
+                self.assertEqual(summary['season_totals_changed'], summary['users_scored'])
+                picks = ConfidencePick.objects.filter(game__week=week, is_correct__isnull=False)
+                self.assertEqual(summary['picks_scored'], picks.count())
+                self.assertEqual(summary['correct_picks'], picks.filter(is_correct=True).count())
+                self.assertEqual(
+                    summary['correct_pick_rate'], round(summary['correct_picks'] / summary['picks_scored'], 4)
+                )
+
+                top = WeeklyResult.objects.filter(week=week).order_by('weekly_rank', 'user__email')[:3]
+                self.assertEqual(summary['top'], [
+                    {
+                        'rank': result.weekly_rank,
+                        'email': result.user.email,
+                        'points': result.confidence_points,
+                        'playoff_points': float(result.playoff_points),
+                    }
+                    for result in top
+                ])
+
+                self.assertEqual(summary['survivor_picks_scored'], SurvivorPick.objects.filter(week=week).count())
+                losses = SurvivorPick.objects.filter(week=week, is_correct=False)
+                self.assertEqual(len(summary['survivor_strikes']), losses.count())
+                for strike in summary['survivor_strikes']:
+                    self.assertEqual(set(strike), {'email', 'team', 'strikes', 'eliminated'})
+                    self.assertIsInstance(strike['strikes'], int)
+                    self.assertIsInstance(strike['eliminated'], bool)
+                self.assertEqual(summary['eliminated'], sorted(summary['eliminated']))
+
+    def test_workers_report_like_serial_runs(self):
+        for args in [('--json',), ('-v', 0), ('-v', 1), ('-v', 2), ('-v', 3)]:
+            with self.subTest(args=args):
+                with transaction.atomic():
+                    serial = self.score_games('--all', *args)
+                    transaction.set_rollback(True)
+                with transaction.atomic():
+                    workers = self.score_games('--all', '--workers', 2, *args)
+                    transaction.set_rollback(True)
+                self.assertEqual(workers, serial)
+        # Each level adds detail to the one below
+        self.assertIn('Weekly Rankings', serial)
+        self.assertIn('Updated ', serial)
+        self.assertIn('✓ ', serial)
+
+    def test_profile_phases(self):
+        with CaptureQueriesContext(connection) as queries:
+            profile = json.loads(self.score_games('--all', '--json', '--profile'))['profile']
+
+        self.assertEqual(profile['total']['queries'], len(queries))
+        for name in ['score_week', 'confidence_totals', 'calculate_weekly_rankings', 'season_stats',
+                     'score_survivor_picks']:
+            with self.subTest(phase=name):
+                self.assertEqual(profile[name]['calls'], 3)
+                self.assertGreater(profile[name]['queries'], 0)
+                self.assertGreater(profile[name]['wall'], 0)
+        # Nested phases are charged to score_week as well
+        nested = ['confidence_totals', 'calculate_weekly_rankings', 'season_stats', 'score_survivor_picks']
+        self.assertGreaterEqual(profile['score_week']['queries'], sum(profile[name]['queries'] for name in nested))
+        self.assertGreaterEqual(profile['total']['queries'], profile['score_week']['queries'])
+
+    def test_profile_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'score_games.pstats')
+            output = self.score_games('--all', '--profile-output', path)
+            self.assertIn(f'cProfile stats written to {path}', output)
+            # --profile-output implies --profile
+            self.assertIn('calculate_weekly_rankings', output)
+            functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn('score_week', functions)
+        self.assertIn('rank_week', functions)
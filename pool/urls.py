@@ -8,4 +8,8 @@ urlpatterns = [
     path('picks/<int:week_id>/', views.make_picks, name='make_picks'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('leaderboard/<int:season_id>/', views.leaderboard, name='leaderboard_season'),
+    path('survivor/', views.survivor, name='survivor'),
+    path('survivor/<int:season_id>/', views.survivor, name='survivor_season'),
+    path('live/', views.live_standings, name='live_standings'),
+    path('live/<int:week_id>/', views.live_standings, name='live_standings_week'),
 ]
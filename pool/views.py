@@ -1,10 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
+from django.db.models import OuterRef, Subquery, Sum
 from django.utils import timezone
-from .models import Season, Week, Game, ConfidencePick, SurvivorPick, Team, UserSeasonStats, WeeklyResult
+from .models import (
+    Season, Week, Game, UserSeasonStats, WeeklyResult, LiveStanding,
+    LeaderboardSnapshot,
+)
 from .forms import WeekPicksForm, SurvivorPickForm
+from .leaderboard import (
+    around_me, decode_cursor, decode_live_cursor, leaderboard_page, live_around_me, live_standings_page,
+)
+from .picks import WeekContext
+from .simulation import get_cached_simulation
+from .survivor import ENTRANTS_PAGE_SIZE, entrants_page, remaining_teams, survivor_dashboard
 
 
 def home(request):
@@ -36,8 +45,7 @@ def home(request):
 
 @login_required
 def make_picks(request, week_id):
-    week = get_object_or_404(Week, id=week_id)
-    games = Game.objects.filter(week=week).order_by('game_time')
+    week = get_object_or_404(Week.objects.select_related('season'), id=week_id)
 
     # Check if picks deadline has passed
     if timezone.now() > week.picks_deadline:
@@ -50,60 +58,20 @@ def make_picks(request, week_id):
         season=week.season
     )
 
-    # Get the Bears team
-    bears_team = Team.objects.get(abbreviation='CHI')
-
-    # Get existing picks
-    existing_confidence_picks = ConfidencePick.objects.filter(
-        user=request.user,
-        game__week=week
-    ).select_related('game', 'picked_team')
-
-    existing_survivor_picks = SurvivorPick.objects.filter(
-        user=request.user,
-        week=week
-    ).select_related('picked_team')
-
-    # Build initial data dict for existing picks
-    initial_data = {}
-    for pick in existing_confidence_picks:
-        initial_data[f'game_{pick.game.id}_team'] = pick.picked_team.id
-        initial_data[f'game_{pick.game.id}_confidence'] = pick.confidence_points
-
-    for i, pick in enumerate(existing_survivor_picks):
-        initial_data[f'survivor_pick_{i+1}'] = pick.picked_team.id
+    # Games, teams and existing picks, loaded once and shared with both forms and the template
+    week_context = WeekContext(week, request.user)
+    games = week_context.games
 
     if request.method == 'POST':
-        confidence_form = WeekPicksForm(request.POST, week=week, user=request.user)
-        survivor_form = SurvivorPickForm(request.POST, week=week, user=request.user)
+        confidence_form = WeekPicksForm(request.POST, week=week, user=request.user, week_context=week_context)
+        survivor_form = SurvivorPickForm(
+            request.POST, week=week, user=request.user, stats=user_stats, week_context=week_context
+        )
 
         if confidence_form.is_valid() and (user_stats.is_eliminated_survivor or survivor_form.is_valid()):
-            # Delete existing picks for this week
-            ConfidencePick.objects.filter(user=request.user, game__week=week).delete()
-            SurvivorPick.objects.filter(user=request.user, week=week).delete()
-
-            # Create new confidence picks
-            for game in games:
-                team_id = int(confidence_form.cleaned_data[f'game_{game.id}_team'])
-                confidence = confidence_form.cleaned_data[f'game_{game.id}_confidence']
-
-                ConfidencePick.objects.create(
-                    user=request.user,
-                    game=game,
-                    picked_team_id=team_id,
-                    confidence_points=confidence
-                )
-
-            # Create new survivor picks (if not eliminated)
-            if not user_stats.is_eliminated_survivor:
-                num_picks = week.survivor_picks_required()
-                for i in range(num_picks):
-                    team_id = int(survivor_form.cleaned_data[f'survivor_pick_{i+1}'])
-                    SurvivorPick.objects.create(
-                        user=request.user,
-                        week=week,
-                        picked_team_id=team_id
-                    )
+            # Only picks that differ from the stored sheet are written, in one transaction
+            new_teams = [] if user_stats.is_eliminated_survivor else survivor_form.picked_teams()
+            week_context.save_picks(confidence_form.picks(), new_teams, user_stats)
 
             messages.success(request, "Your picks have been saved!")
             return redirect('pool:home')
@@ -121,14 +89,19 @@ def make_picks(request, week_id):
             existing_picks_dict = post_picks_dict
     else:
         # Load forms with initial data
-        confidence_form = WeekPicksForm(initial=initial_data, week=week, user=request.user)
-        survivor_form = SurvivorPickForm(initial=initial_data, week=week, user=request.user)
+        initial_data = week_context.initial_data()
+        confidence_form = WeekPicksForm(
+            initial=initial_data, week=week, user=request.user, week_context=week_context
+        )
+        survivor_form = SurvivorPickForm(
+            initial=initial_data, week=week, user=request.user, stats=user_stats, week_context=week_context
+        )
 
     # Build dictionaries for template access
     existing_picks_dict = {}
-    for pick in existing_confidence_picks:
-        existing_picks_dict[pick.game.id] = {
-            'team_id': pick.picked_team.id,
+    for game_id, pick in week_context.confidence_picks.items():
+        existing_picks_dict[game_id] = {
+            'team_id': pick.picked_team_id,
             'confidence': pick.confidence_points
         }
 
@@ -138,13 +111,26 @@ def make_picks(request, week_id):
         'confidence_form': confidence_form,
         'survivor_form': survivor_form,
         'user_stats': user_stats,
-        'bears_team': bears_team,
+        'bears_team': week_context.bears,
         'existing_picks': existing_picks_dict,
     }
 
     return render(request, 'pool/make_picks.html', context)
 
 
+def rank_chart(snapshots, width=600, height=160, padding=20):
+    """SVG polyline points for a rank-by-week line, rank 1 at the top"""
+    if len(snapshots) < 2:
+        return ''
+    worst = max(max(snapshot.season_rank for snapshot in snapshots), 2)
+    step = (width - 2 * padding) / (len(snapshots) - 1)
+    scale = (height - 2 * padding) / (worst - 1)
+    return ' '.join(
+        f'{padding + index * step:.1f},{padding + (snapshot.season_rank - 1) * scale:.1f}'
+        for index, snapshot in enumerate(snapshots)
+    )
+
+
 @login_required
 def leaderboard(request, season_id=None):
     if season_id:
@@ -156,9 +142,27 @@ def leaderboard(request, season_id=None):
         messages.error(request, "No active season found.")
         return redirect('pool:home')
 
-    standings = UserSeasonStats.objects.filter(
-        season=season
-    ).select_related('user').order_by('-playoff_points', '-total_confidence_points')
+    standings = UserSeasonStats.objects.filter(season=season).select_related('user')
+
+    # Movement comes from the snapshot written by the latest scoring run
+    snapshots = LeaderboardSnapshot.objects.filter(week__season=season)
+    latest_week_id = snapshots.order_by('-week__week_number').values_list('week_id', flat=True).first()
+    if latest_week_id:
+        latest = snapshots.filter(week_id=latest_week_id, user=OuterRef('user'))
+        standings = standings.annotate(rank_change=Subquery(latest.values('rank_change')))
+
+    my_stats = UserSeasonStats.objects.filter(season=season, user=request.user).first()
+    around = request.GET.get('around') == 'me' and my_stats is not None
+    if around:
+        page = around_me(standings, my_stats)
+    else:
+        page = leaderboard_page(
+            standings,
+            after=decode_cursor(request.GET.get('after')),
+            before=decode_cursor(request.GET.get('before')),
+        )
+
+    rank_history = list(snapshots.filter(user=request.user).select_related('week').order_by('week__week_number'))
 
     # Get weekly results for the season
     weekly_results = WeeklyResult.objects.filter(
@@ -167,8 +171,109 @@ def leaderboard(request, season_id=None):
 
     context = {
         'season': season,
-        'standings': standings,
+        'standings': page['rows'],
+        'previous_cursor': page['previous_cursor'],
+        'next_cursor': page['next_cursor'],
+        'around_me': around,
+        'my_stats': my_stats,
         'weekly_results': weekly_results,
+        'rank_history': rank_history,
+        'rank_chart': rank_chart(rank_history),
     }
 
     return render(request, 'pool/leaderboard.html', context)
+
+
+@login_required
+def live_standings(request, week_id=None):
+    if week_id:
+        week = get_object_or_404(Week, id=week_id)
+    else:
+        week = Week.objects.filter(is_active=True).first()
+
+    if not week:
+        messages.error(request, "No active week found.")
+        return redirect('pool:home')
+
+    standings = LiveStanding.objects.filter(week=week).select_related('user')
+
+    my_standing = standings.filter(user=request.user, projected_rank__isnull=False).first()
+    around = request.GET.get('around') == 'me' and my_standing is not None
+    if around:
+        page = live_around_me(standings, my_standing)
+    else:
+        page = live_standings_page(
+            standings,
+            after=decode_live_cursor(request.GET.get('after')),
+            before=decode_live_cursor(request.GET.get('before')),
+        )
+
+    games = Game.objects.filter(
+        week=week,
+        home_score__isnull=False,
+        away_score__isnull=False,
+    ).select_related('home_team', 'away_team').order_by('game_time')
+
+    # Simulations run from score_games --live; never simulate inside a request
+    simulation = get_cached_simulation(week)
+    outlook = simulation['users'].get(request.user.id) if simulation else None
+
+    context = {
+        'week': week,
+        'standings': page['rows'],
+        'previous_cursor': page['previous_cursor'],
+        'next_cursor': page['next_cursor'],
+        'around_me': around,
+        'my_standing': my_standing,
+        'games': games,
+        'simulation': simulation,
+        'outlook': outlook,
+    }
+
+    return render(request, 'pool/live_standings.html', context)
+
+
+@login_required
+def survivor(request, season_id=None):
+    if season_id:
+        season = get_object_or_404(Season, id=season_id)
+    else:
+        season = Season.objects.filter(is_active=True).first()
+
+    if not season:
+        messages.error(request, "No active season found.")
+        return redirect('pool:home')
+
+    week = Week.objects.filter(season=season, is_active=True).first()
+    dashboard = survivor_dashboard(season, week)
+
+    position, me = next(
+        ((i, entrant) for i, entrant in enumerate(dashboard['users']) if entrant['user_id'] == request.user.id),
+        (None, None),
+    )
+    around = request.GET.get('around') == 'me' and me is not None
+    if around:
+        page_number = position // ENTRANTS_PAGE_SIZE + 1
+    else:
+        try:
+            page_number = int(request.GET.get('page', 1))
+        except ValueError:
+            page_number = 1
+    page = entrants_page(dashboard, page_number)
+    me_on_page = any(entrant is me for entrant in page['rows'])
+
+    context = {
+        'season': season,
+        'week': week,
+        'dashboard': dashboard,
+        # The user's own row leads the table when their page is not the one shown
+        'entrants': page['rows'] if me is None or me_on_page else [me] + page['rows'],
+        'previous_page': page['previous_page'],
+        'next_page': page['next_page'],
+        'around_me': around,
+        'me': me,
+        'my_remaining_teams': remaining_teams(dashboard, me['teams_used']) if me else [],
+        'picked_teams': [team for team in dashboard['teams'] if team['picks']],
+    }
+
+    return render(request, 'pool/survivor.html', context)